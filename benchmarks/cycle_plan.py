@@ -0,0 +1,91 @@
+"""Benchmarks the reads of a farming cycle: one request after another, each after its own pacing delay (as
+before), vs the CyclePlan batches.
+
+The reads go to a local fake API answering after `--latency` seconds. The cycle reads the profile, quests and
+upgrades, then re-reads the profile (and upgrades) before each of `--upgrades` purchases.
+Pacing delays are multiplied by `--pacing-scale` to keep the run short.
+
+Run from the repository root:
+    python -m benchmarks.cycle_plan --upgrades 5
+"""
+import argparse
+import asyncio
+from random import uniform
+from time import perf_counter
+
+import aiohttp
+from aiohttp import web
+
+from bot.core.cycle_plan import CyclePlan, Step
+
+
+async def start_api(latency: float) -> tuple[web.AppRunner, str]:
+    async def handle(request: web.Request):
+        await asyncio.sleep(latency)
+        return web.json_response({'status': True, 'result': {}})
+
+    app = web.Application()
+    app.router.add_route('*', '/{path:.*}', handle)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, '127.0.0.1', 0)
+    await site.start()
+    port = site._server.sockets[0].getsockname()[1]
+    return runner, f"http://127.0.0.1:{port}"
+
+
+async def sequential_cycle(session: aiohttp.ClientSession, url: str, upgrades: int, scale: float):
+    async def read(path: str, pacing: tuple[float, float]):
+        await asyncio.sleep(uniform(*pacing) * scale)
+        async with session.get(f"{url}/{path}") as response:
+            return await response.json()
+
+    await read('profile', (1, 3))
+    await read('quests', (1, 3))
+    for _ in range(upgrades + 1):
+        await read('profile', (1, 3))
+        await read('upgrades', (2, 5))
+
+
+async def planned_cycle(session: aiohttp.ClientSession, url: str, upgrades: int, scale: float):
+    def read(path: str):
+        async def run(_):
+            async with session.get(f"{url}/{path}") as response:
+                return await response.json()
+        return run
+
+    pacing = (1 * scale, 3 * scale)
+    await CyclePlan([Step('profile', read('profile'), required=True),
+                     Step('quests', read('quests'), after=('profile',)),
+                     Step('upgrades', read('upgrades'), after=('profile',))], pacing).run()
+    await CyclePlan([Step('profile', read('profile'), required=True)], pacing).run()
+    for _ in range(upgrades):
+        await CyclePlan([Step('profile', read('profile'), required=True),
+                         Step('upgrades', read('upgrades'))], pacing).run()
+
+
+async def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--upgrades", type=int, default=5)
+    parser.add_argument("--latency", type=float, default=0.3)
+    parser.add_argument("--pacing-scale", type=float, default=0.2)
+    parser.add_argument("--runs", type=int, default=3)
+    args = parser.parse_args()
+
+    runner, url = await start_api(args.latency)
+    try:
+        async with aiohttp.ClientSession() as session:
+            for name, cycle in (('sequential', sequential_cycle), ('cycle plan', planned_cycle)):
+                elapsed = []
+                for _ in range(args.runs):
+                    start = perf_counter()
+                    await cycle(session, url, args.upgrades, args.pacing_scale)
+                    elapsed.append(perf_counter() - start)
+                print(f"{name}: {sum(elapsed) / len(elapsed):.2f}s per cycle "
+                      f"(min {min(elapsed):.2f}s, max {max(elapsed):.2f}s)")
+    finally:
+        await runner.cleanup()
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
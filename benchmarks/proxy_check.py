@@ -0,0 +1,150 @@
+"""Benchmarks sequential vs concurrent proxy health checks against a local fake proxy farm.
+
+The farm consists of HTTP proxies listening on localhost:
+    fast      - answer right away
+    slow      - answer after a random delay
+    blackhole - accept the connection and never answer
+    dead      - refuse the connection
+
+Run from the repository root:
+    python -m benchmarks.proxy_check --proxies 200 --sessions 20
+"""
+import argparse
+import asyncio
+import socket
+import sys
+import tempfile
+from random import Random
+from statistics import mean, median
+from time import perf_counter
+
+from bot.utils import proxy_utils
+from bot.utils.proxy_health import ProxyHealthCache
+
+TARGET_URL = 'http://127.0.0.1:9/ip'
+
+
+class FakeProxy:
+    def __init__(self, kind: str, delay: float = 0):
+        self.kind = kind
+        self.delay = delay
+        self.server = None
+        self.port = None
+
+    async def start(self):
+        if self.kind == 'dead':
+            with socket.socket() as sock:
+                sock.bind(('127.0.0.1', 0))
+                self.port = sock.getsockname()[1]
+            return
+        self.server = await asyncio.start_server(self.handle, '127.0.0.1', 0)
+        self.port = self.server.sockets[0].getsockname()[1]
+
+    async def stop(self):
+        if self.server:
+            self.server.close()
+            await self.server.wait_closed()
+
+    @property
+    def url(self):
+        return f"http://127.0.0.1:{self.port}"
+
+    async def handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            request = await reader.readuntil(b'\r\n\r\n')
+            if self.kind == 'blackhole':
+                await asyncio.sleep(3600)
+            await asyncio.sleep(self.delay)
+            if request.startswith(b'CONNECT'):
+                writer.write(b'HTTP/1.1 200 Connection established\r\n\r\n')
+                await writer.drain()
+                await reader.readuntil(b'\r\n\r\n')
+            writer.write(b'HTTP/1.1 200 OK\r\nContent-Length: 9\r\nConnection: close\r\n\r\n127.0.0.1')
+            await writer.drain()
+        except (asyncio.IncompleteReadError, ConnectionError, asyncio.CancelledError):
+            pass
+        finally:
+            writer.close()
+
+
+def build_farm(size: int, seed: int) -> list[FakeProxy]:
+    rnd = Random(seed)
+    farm = []
+    for _ in range(size):
+        roll = rnd.random()
+        if roll < 0.35:
+            farm.append(FakeProxy('dead'))
+        elif roll < 0.5:
+            farm.append(FakeProxy('blackhole'))
+        elif roll < 0.8:
+            farm.append(FakeProxy('slow', rnd.uniform(0.5, 2.5)))
+        else:
+            farm.append(FakeProxy('fast'))
+    return farm
+
+
+async def sequential_pick(candidates: list[str], timeout: float) -> str | None:
+    for proxy in candidates:
+        if await proxy_utils.probe_proxy(proxy, TARGET_URL, timeout):
+            return proxy
+    return None
+
+
+async def assign_sessions(picker, proxies: list[str], sessions: int, seed: int) -> tuple[float, int]:
+    rnd = Random(seed)
+    free = proxies.copy()
+    assigned = 0
+    start = perf_counter()
+    for _ in range(sessions):
+        rnd.shuffle(free)
+        proxy = await picker(free)
+        if not proxy:
+            break
+        free.remove(proxy)
+        assigned += 1
+    return perf_counter() - start, assigned
+
+
+async def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--proxies", type=int, default=200)
+    parser.add_argument("--sessions", type=int, default=20)
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--timeout", type=float, default=3)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--skip-sequential", action="store_true")
+    args = parser.parse_args()
+
+    # Measure raw probing, the health cache would answer repeated checks without touching the farm
+    proxy_utils.proxy_health = ProxyHealthCache(file_path=tempfile.mktemp(suffix='.json'), ttl=0)
+
+    farm = build_farm(args.proxies, args.seed)
+    await asyncio.gather(*[proxy.start() for proxy in farm])
+    proxies = [proxy.url for proxy in farm]
+    try:
+        start = perf_counter()
+        latencies = await proxy_utils.check_proxies(proxies, TARGET_URL, args.concurrency, args.timeout)
+        elapsed = perf_counter() - start
+        alive = [latency for latency in latencies.values() if latency is not None]
+        print(f"check_proxies: {len(alive)}/{len(proxies)} alive in {elapsed:.2f}s" +
+              (f" | latency mean {mean(alive):.3f}s median {median(alive):.3f}s max {max(alive):.3f}s"
+               if alive else ""))
+
+        async def concurrent_picker(candidates):
+            return await proxy_utils.find_working_proxy(candidates, TARGET_URL, args.concurrency, args.timeout)
+
+        elapsed, assigned = await assign_sessions(concurrent_picker, proxies, args.sessions, args.seed)
+        print(f"find_working_proxy: {assigned}/{args.sessions} sessions bound in {elapsed:.2f}s")
+
+        if not args.skip_sequential:
+            elapsed, assigned = await assign_sessions(lambda candidates: sequential_pick(candidates, args.timeout),
+                                                      proxies, args.sessions, args.seed)
+            print(f"sequential: {assigned}/{args.sessions} sessions bound in {elapsed:.2f}s")
+    finally:
+        await asyncio.gather(*[proxy.stop() for proxy in farm])
+
+
+if __name__ == '__main__':
+    if sys.platform == 'win32':
+        asyncio.set_event_loop_policy(asyncio.WindowsSelectorEventLoopPolicy())
+    asyncio.run(main())
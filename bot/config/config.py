@@ -7,6 +7,7 @@ class Settings(BaseSettings):
     API_ID: int
     API_HASH: str
     GLOBAL_CONFIG_PATH: str = "TG_FARM"
+    CONFIG_BACKEND: str = "json"
 
     FIX_CERT: bool = False
 
@@ -23,10 +24,21 @@ class Settings(BaseSettings):
     RANDOM_SLEEP_TIME: list[int] = [3600, 10800]
 
     SESSION_START_DELAY: int = 360
+    STARTUP_CONCURRENCY: int = 10
+    MAX_ACTIVE_CYCLES: int = 100
+    TG_CONNECTION_IDLE_TIMEOUT: int = 0
+    TG_MAX_CONNECTIONS: int = 100
+    TG_WEB_DATA_REFRESH_MARGIN: int = 300
+    TG_OPERATIONS_PER_SECOND: float = 5
+    TG_OPERATIONS_BURST: int = 10
+    TG_MAX_CONCURRENT_OPERATIONS: int = 20
 
     SESSIONS_PER_PROXY: int = 1
     USE_PROXY_FROM_FILE: bool = True
     DISABLE_PROXY_REPLACE: bool = False
+    PROXY_CHECK_CONCURRENCY: int = 50
+    HTTP_CONNECTIONS_PER_PROXY: int = 100
+    PROXY_HEALTH_TTL: int = 3600
     USE_PROXY_CHAIN: bool = False
 
     DEVICE_PARAMS: bool = False
@@ -0,0 +1,44 @@
+import asyncio
+from dataclasses import dataclass
+from random import uniform
+from typing import Any, Awaitable, Callable
+
+
+@dataclass
+class Step:
+    """A read of the cycle. `run` gets the results of the steps done so far, `after` names the steps it needs.
+    If a `required` step returns nothing, the plan stops there."""
+    name: str
+    run: Callable[[dict[str, Any]], Awaitable[Any]]
+    after: tuple[str, ...] = ()
+    required: bool = False
+
+
+class CyclePlan:
+    """Runs the steps in dependency order. Steps whose dependencies are done are sent together, after a single
+    pacing delay for the whole batch instead of one per request."""
+
+    def __init__(self, steps: list[Step], pacing: tuple[float, float] = (1, 3)):
+        names = {step.name for step in steps}
+        for step in steps:
+            missing = set(step.after) - names
+            if missing:
+                raise ValueError(f"Step {step.name} depends on unknown steps: {', '.join(sorted(missing))}")
+        self.steps = steps
+        self.pacing = pacing
+
+    async def run(self) -> dict[str, Any]:
+        """Returns the results by step name. Steps after a failed required step are missing."""
+        results: dict[str, Any] = {}
+        pending = list(self.steps)
+        while pending:
+            batch = [step for step in pending if all(name in results for name in step.after)]
+            if not batch:
+                raise ValueError(f"Circular dependencies between steps: {', '.join(step.name for step in pending)}")
+            await asyncio.sleep(uniform(*self.pacing))
+            for step, result in zip(batch, await asyncio.gather(*(step.run(results) for step in batch))):
+                results[step.name] = result
+                if step.required and not result:
+                    return results
+            pending = [step for step in pending if step not in batch]
+        return results
@@ -1,16 +1,23 @@
 import glob
 import asyncio
 import argparse
+import contextlib
 import os
-from copy import deepcopy
+from time import time
 
-from bot.utils.universal_telegram_client import UniversalTelegramClient
+from bot.utils.universal_telegram_client import UniversalTelegramClient, detect_session_format
 
 from bot.config import settings
 from bot.core.agents import generate_random_user_agent
-from bot.utils import logger, config_utils, proxy_utils, CONFIG_PATH, SESSIONS_PATH, PROXIES_PATH, build_check
-from bot.core.tapper import run_tapper
+from bot.utils import logger, log_error, config_utils, proxy_utils, first_run, CONFIG_PATH, SESSIONS_PATH, PROXIES_PATH, \
+    build_check
+from bot.core.scheduler import Scheduler
+from bot.core.tapper import schedule_tapper, log_web_data_stats, WEB_DATA_STATS_INTERVAL
 from bot.core.registrator import register_sessions
+from bot.utils.http_connectors import connectors
+from bot.utils.tg_connections import connection_manager
+from bot.utils.sharding import Shard, ShardLeases
+from bot.utils.tg_admission import telegram_admission, STATS_INTERVAL as ADMISSION_STATS_INTERVAL
 
 START_TEXT = """
 
@@ -43,12 +50,18 @@ def prompt_user_action() -> int:
 async def process() -> None:
     parser = argparse.ArgumentParser()
     parser.add_argument("-a", "--action", type=int, help="Action to perform")
+    parser.add_argument("-w", "--workers", type=int, default=1,
+                        help="Amount of worker processes to split sessions between")
+    parser.add_argument("-s", "--shard", type=Shard.from_str, default=None,
+                        help="Run only the i-th of n slices of the sessions (i/n), for hosts sharing GLOBAL_CONFIG_PATH")
     args = parser.parse_args()
 
+    shard_info = f" (shard {args.shard})" if args.shard else ""
     if not settings.USE_PROXY_FROM_FILE:
-        logger.info(f"Detected {len(get_sessions(SESSIONS_PATH))} sessions | USE_PROXY_FROM_FILE=False")
+        logger.info(f"Detected {len(get_sessions(SESSIONS_PATH, args.shard))} sessions{shard_info} | "
+                    f"USE_PROXY_FROM_FILE=False")
     else:
-        logger.info(f"Detected {len(get_sessions(SESSIONS_PATH))} sessions | "
+        logger.info(f"Detected {len(get_sessions(SESSIONS_PATH, args.shard))} sessions{shard_info} | "
                     f"{len(proxy_utils.get_proxies(PROXIES_PATH))} proxies")
 
     action = args.action or prompt_user_action()
@@ -56,105 +69,216 @@ async def process() -> None:
     if action == 1:
         if not API_ID or not API_HASH:
             raise ValueError("API_ID and API_HASH not found in the .env file.")
-        await run_tasks()
+        if args.workers > 1:
+            from bot.core.workers import run_workers
+            await run_workers(args.workers, args.shard)
+        else:
+            await run_tasks(args.shard)
     elif action == 2:
         await register_sessions()
 
 
-def get_sessions(sessions_folder: str) -> list[str]:
+def get_sessions(sessions_folder: str, shard: Shard = None, shard_index: int = None) -> list[str]:
+    """Returns paths of the session files without extension.
+    If shard is given, returns only the sessions of shard_index or of the shards held by this host."""
     session_names = glob.glob(f"{sessions_folder}/*.session")
     session_names += glob.glob(f"{sessions_folder}/telethon/*.session")
     session_names += glob.glob(f"{sessions_folder}/pyrogram/*.session")
-    return [file.replace('.session', '') for file in sorted(session_names)]
-
-
-async def get_tg_clients() -> list[UniversalTelegramClient]:
-    session_paths = get_sessions(SESSIONS_PATH)
-
-    if not session_paths:
-        raise FileNotFoundError("Session files not found")
-    tg_clients = []
-    for session in session_paths:
-        session_name = os.path.basename(session)
-        accounts_config = config_utils.read_config_file(CONFIG_PATH)
-        session_config: dict = deepcopy(accounts_config.get(session_name, {}))
-        if 'api' not in session_config:
-            session_config['api'] = {}
-        api_config = session_config.get('api', {})
-        api = None
-        if api_config.get('api_id') in [4, 6, 2040, 10840, 21724]:
-            api = config_utils.get_api(api_config)
-
-        if api:
-            client_params = {
-                "session": session,
-                "api": api
-            }
-        else:
-            client_params = {
-                "api_id": api_config.get("api_id", API_ID),
-                "api_hash": api_config.get("api_hash", API_HASH),
-                "session": session,
-                "lang_code": api_config.get("lang_code", "en"),
-                "system_lang_code": api_config.get("system_lang_code", "en-US")
-            }
-
-            for key in ("device_model", "system_version", "app_version"):
-                if api_config.get(key):
-                    client_params[key] = api_config[key]
-
-        session_config['user_agent'] = session_config.get('user_agent', generate_random_user_agent())
-        api_config.update(api_id=client_params.get('api_id') or client_params.get('api').api_id,
-                          api_hash=client_params.get('api_hash') or client_params.get('api').api_hash)
-
-        session_proxy = session_config.get('proxy')
-        if not session_proxy and 'proxy' in session_config.keys():
-            tg_clients.append(UniversalTelegramClient(**client_params))
-            if accounts_config.get(session_name) != session_config:
-                await config_utils.update_session_config_in_file(session_name, session_config, CONFIG_PATH)
+    sessions = [file.replace('.session', '') for file in sorted(session_names)]
+    return [session for session in sessions if shard.owns(session, shard_index)] if shard else sessions
+
+
+def get_shard_leases(shard: Shard) -> ShardLeases:
+    return ShardLeases(shard, os.path.join(os.path.dirname(CONFIG_PATH), 'lock_files'))
+
+
+def prepare_session_config(session: str) -> dict:
+    """Builds the config of the session: imports api params from the session's .json file if it exists
+    and fills in the user agent and api id/hash. The result is not saved."""
+    session_name = os.path.basename(session)
+    session_config: dict = config_utils.get_session_config(session_name, CONFIG_PATH)
+    parsed_json = config_utils.import_session_json(session)
+    if parsed_json:
+        session_config['api'] = parsed_json
+    if 'api' not in session_config:
+        session_config['api'] = {}
+    session_config['user_agent'] = session_config.get('user_agent', generate_random_user_agent())
+    session_config['session_format'] = get_session_format(session, session_config.get('session_format'))
+    return session_config
+
+
+def get_session_format(session: str, cached_format: dict = None) -> dict:
+    """Format of the session file. The schema is only read again if the file changed since `cached_format`."""
+    session_file = f"{session}.session"
+    mtime = os.path.getmtime(session_file)
+    if cached_format and cached_format.get('mtime') == mtime:
+        return cached_format
+    return {'type': detect_session_format(session_file), 'mtime': mtime}
+
+
+def get_client_params(session: str, session_config: dict) -> dict:
+    api_config = session_config.get('api', {})
+    api = None
+    if api_config.get('api_id') in [4, 6, 2040, 10840, 21724]:
+        api = config_utils.get_api(api_config)
+
+    if api:
+        client_params = {
+            "session": session,
+            "api": api
+        }
+    else:
+        client_params = {
+            "api_id": api_config.get("api_id", API_ID),
+            "api_hash": api_config.get("api_hash", API_HASH),
+            "session": session,
+            "lang_code": api_config.get("lang_code", "en"),
+            "system_lang_code": api_config.get("system_lang_code", "en-US")
+        }
+
+        for key in ("device_model", "system_version", "app_version"):
+            if api_config.get(key):
+                client_params[key] = api_config[key]
+
+    api_config.update(api_id=client_params.get('api_id') or client_params.get('api').api_id,
+                      api_hash=client_params.get('api_hash') or client_params.get('api').api_hash)
+    return client_params
+
+
+def create_tg_client(session: str, session_config: dict) -> UniversalTelegramClient:
+    return UniversalTelegramClient(session_format=session_config.get('session_format', {}).get('type'),
+                                   **get_client_params(session, session_config))
+
+
+async def bind_session_proxy(session_name: str, session_config: dict) -> bool:
+    """Sets a working proxy in the session config. Returns False if the session has to be skipped."""
+    session_proxy = session_config.get('proxy')
+    if not session_proxy and 'proxy' in session_config.keys():
+        return True
+
+    accounts_config = config_utils.get_config_store(CONFIG_PATH).config
+    if settings.DISABLE_PROXY_REPLACE:
+        proxy = session_proxy or proxy_utils.get_proxy_allocator(accounts_config).acquire(session_name)
+    else:
+        proxy = await proxy_utils.get_working_proxy(accounts_config, session_proxy, session_name) \
+            if session_proxy or settings.USE_PROXY_FROM_FILE else None
+
+    if not proxy and (settings.USE_PROXY_FROM_FILE or session_proxy):
+        logger.warning(f"{session_name} | Didn't find a working unused proxy for session | Skipping")
+        return False
+    session_config['proxy'] = proxy
+    return True
+
+
+async def save_session_config(session_name: str, session_config: dict):
+    if config_utils.get_config_store(CONFIG_PATH).config.get(session_name) != session_config:
+        await config_utils.update_session_config_in_file(session_name, session_config, CONFIG_PATH)
+
+
+async def prepare_session(session: str, binding_semaphore: asyncio.Semaphore = None) -> dict | None:
+    """Runs the config stages of one session: config preparation and proxy binding.
+    Proxy binding is limited by binding_semaphore if given. The config is saved to the config store
+    after each stage.
+
+     Returns:
+       The session config or None if the session was skipped.
+     """
+    session_name = os.path.basename(session)
+    session_config = prepare_session_config(session)
+    get_client_params(session, session_config)
+    # The imported .json file is already deleted, its api params must be kept even if binding fails
+    await save_session_config(session_name, session_config)
+
+    async with binding_semaphore or contextlib.nullcontext():
+        if not await bind_session_proxy(session_name, session_config):
+            return None
+    await save_session_config(session_name, session_config)
+    return session_config
+
+
+async def iter_session_configs(session_paths: list[str]):
+    """Yields (session, session_config) as soon as the session is prepared. Sessions are prepared concurrently,
+    at most STARTUP_CONCURRENCY of them bind proxies at the same time."""
+    binding_semaphore = asyncio.Semaphore(settings.STARTUP_CONCURRENCY)
+
+    async def prepare(session_path: str):
+        return session_path, await prepare_session(session_path, binding_semaphore)
+
+    for next_session in asyncio.as_completed([prepare(session) for session in session_paths]):
+        try:
+            session, session_config = await next_session
+        except Exception as error:
+            log_error(f"Failed to prepare session: {error}")
             continue
+        if session_config:
+            yield session, session_config
 
-        else:
-            if settings.DISABLE_PROXY_REPLACE:
-                proxy = session_proxy or next(iter(proxy_utils.get_unused_proxies(accounts_config, PROXIES_PATH)), None)
-            else:
-                proxy = await proxy_utils.get_working_proxy(accounts_config, session_proxy) \
-                    if session_proxy or settings.USE_PROXY_FROM_FILE else None
-
-            if not proxy and (settings.USE_PROXY_FROM_FILE or session_proxy):
-                logger.warning(f"{session_name} | Didn't find a working unused proxy for session | Skipping")
+
+async def iter_tg_clients(session_paths: list[str]):
+    """Yields clients as soon as their sessions are prepared."""
+    async for session, session_config in iter_session_configs(session_paths):
+        yield create_tg_client(session, session_config)
+
+
+async def run_tasks(shard: Shard = None):
+    start_time = time()
+    first_request_logged = False
+
+    def on_first_request(session_name: str):
+        nonlocal first_request_logged
+        if not first_request_logged:
+            first_request_logged = True
+            logger.info(f"<ly>{session_name}</ly> | First API request completed "
+                        f"<lc>{time() - start_time:.1f}s</lc> after startup")
+
+    async def start_sessions(session_paths: list[str]):
+        sessions_count = 0
+        async for tg_client in iter_tg_clients(session_paths):
+            # The shard may have been handed back while its sessions were being prepared
+            if shard and not shard.owns(tg_client.session_name):
                 continue
-            else:
-                tg_clients.append(UniversalTelegramClient(**client_params))
-                session_config['proxy'] = proxy
-                if accounts_config.get(session_name) != session_config:
-                    await config_utils.update_session_config_in_file(session_name, session_config, CONFIG_PATH)
-
-    return tg_clients
-
-
-async def init_config_file():
-    session_paths = get_sessions(SESSIONS_PATH)
-
-    if not session_paths:
-        raise FileNotFoundError("Session files not found")
-    for session in session_paths:
-        session_name = os.path.basename(session)
-        parsed_json = config_utils.import_session_json(session)
-        if parsed_json:
-            accounts_config = config_utils.read_config_file(CONFIG_PATH)
-            session_config: dict = deepcopy(accounts_config.get(session_name, {}))
-            session_config['user_agent'] = session_config.get('user_agent', generate_random_user_agent())
-            session_config['api'] = parsed_json
-            if accounts_config.get(session_name) != session_config:
-                await config_utils.update_session_config_in_file(session_name, session_config, CONFIG_PATH)
-
-
-async def run_tasks():
-    await config_utils.restructure_config(CONFIG_PATH)
-    await init_config_file()
-    await build_check.check_base_url()
-    tg_clients = await get_tg_clients()
-    tasks = [asyncio.create_task(run_tapper(tg_client=tg_client)) for tg_client in tg_clients]
-    tasks.append(asyncio.create_task(build_check.check_bot_update_loop(2000)))
-    await asyncio.gather(*tasks)
+            if not sessions_count:
+                await asyncio.shield(base_url_check)
+                logger.info(f"First session started <lc>{time() - start_time:.1f}s</lc> after startup")
+            runners[tg_client.session_name] = schedule_tapper(scheduler, tg_client, on_first_request)
+            sessions_count += 1
+        logger.info(f"All {sessions_count} sessions started <lc>{time() - start_time:.1f}s</lc> after startup")
+
+    async def take_over_shard(index: int):
+        await start_sessions(get_sessions(SESSIONS_PATH, shard, index))
+
+    async def stop_shard(index: int):
+        for session in get_sessions(SESSIONS_PATH, shard, index):
+            runner = runners.pop(os.path.basename(session), None)
+            if runner:
+                await runner.stop()
+
+    runners = {}
+
+    scheduler = Scheduler(settings.MAX_ACTIVE_CYCLES)
+    scheduler.schedule(log_web_data_stats, WEB_DATA_STATS_INTERVAL)
+    scheduler.schedule(telegram_admission.log_stats, ADMISSION_STATS_INTERVAL)
+    leases = get_shard_leases(shard) if shard else None
+    try:
+        await config_utils.restructure_config(CONFIG_PATH)
+        await first_run.compact()
+        if leases:
+            await leases.acquire()
+        session_paths = get_sessions(SESSIONS_PATH, shard)
+        if not session_paths:
+            raise FileNotFoundError("Session files not found")
+
+        base_url_check = asyncio.create_task(build_check.check_base_url())
+        tasks = [asyncio.create_task(scheduler.run()),
+                 asyncio.create_task(build_check.check_bot_update_loop(2000))]
+        if leases:
+            tasks.append(asyncio.create_task(leases.keep_alive(take_over_shard, stop_shard)))
+        await start_sessions(session_paths)
+        await config_utils.flush_config_stores()
+        await asyncio.gather(*tasks)
+    finally:
+        if leases:
+            leases.release()
+        await config_utils.flush_config_stores()
+        await connectors.close_all()
+        await connection_manager.close_all()
@@ -36,7 +36,7 @@ async def register_sessions() -> None:
                 'app_version': input('app_version: ').strip()
             }
         )
-    accounts_config = config_utils.read_config_file(CONFIG_PATH)
+    accounts_config = config_utils.get_config_store(CONFIG_PATH).config
     accounts_data = {
         'api_id': API_ID,
         'api_hash': API_HASH,
@@ -46,20 +46,14 @@ async def register_sessions() -> None:
 
     if settings.USE_PROXY_FROM_FILE:
         proxies = proxy_utils.get_unused_proxies(accounts_config, PROXIES_PATH)
-        if not proxies:
+        proxy_str = await proxy_utils.find_working_proxy(proxies) if proxies else None
+        if not proxy_str:
             raise Exception('No unused proxies left')
-        for prox in proxies:
-            if await proxy_utils.check_proxy(prox):
-                proxy_str = prox
-                proxy = Proxy.from_str(proxy_str)
-                accounts_data['proxy'] = proxy_str
-                break
-            else:
-                raise Exception('No unused proxies left')
+        proxy = Proxy.from_str(proxy_str)
+        accounts_data['proxy'] = proxy_str
     else:
         accounts_data['proxy'] = None
 
-    accounts_config[session_name] = accounts_data
     while True:
         res = input('Which session to create?\n1. Telethon\n2. Pyrogram\n').strip()
         if res not in ['1', '2']:
@@ -100,7 +94,8 @@ async def register_sessions() -> None:
         user_data = await session.get_me()
 
     if user_data:
-        await config_utils.write_config_file(accounts_config, CONFIG_PATH)
+        await config_utils.update_session_config_in_file(session_name, accounts_data, CONFIG_PATH)
+        await config_utils.flush_config_stores()
         logger.success(
             f'Session added successfully @{user_data.username} | {user_data.first_name} {user_data.last_name}'
         )
@@ -0,0 +1,94 @@
+import asyncio
+import heapq
+from itertools import count
+from time import monotonic
+from typing import Awaitable, Callable, Hashable
+
+from bot.utils import log_error
+
+Job = Callable[[], Awaitable[float | None]]
+
+
+class Scheduler:
+    """Runs jobs at their due time from a single timer.
+
+    Jobs are kept in a priority queue ordered by their next run time. A job is a coroutine function that
+    returns the delay in seconds until its next run, or None when it shouldn't run again. Only due jobs have
+    a task, at most `max_active` of them at once (0 - no limit), so the amount of live coroutines follows
+    the amount of active work rather than the amount of jobs. Jobs scheduled with a `key` (e.g. the session
+    name) can be cancelled together.
+    """
+
+    def __init__(self, max_active: int = 0):
+        self._queue: list[tuple[float, int, Job, Hashable]] = []
+        self._counter = count()
+        self._wakeup = asyncio.Event()
+        self._semaphore = asyncio.Semaphore(max_active) if max_active > 0 else None
+        self._tasks: dict[asyncio.Task, Hashable] = {}
+
+    @property
+    def active(self) -> int:
+        """Amount of jobs running right now."""
+        return len(self._tasks)
+
+    @property
+    def pending(self) -> int:
+        """Amount of jobs waiting for their due time."""
+        return len(self._queue)
+
+    def schedule(self, job: Job, delay: float = 0, key: Hashable = None):
+        """Runs the job in `delay` seconds."""
+        due = monotonic() + max(delay, 0)
+        if not self._queue or due < self._queue[0][0]:
+            self._wakeup.set()
+        heapq.heappush(self._queue, (due, next(self._counter), job, key))
+
+    def cancel(self, key: Hashable):
+        """Drops the waiting jobs scheduled with `key` and cancels its running ones."""
+        self._queue = [entry for entry in self._queue if entry[3] != key]
+        heapq.heapify(self._queue)
+        for task, task_key in list(self._tasks.items()):
+            if task_key == key:
+                task.cancel()
+
+    async def run(self):
+        while True:
+            if not self._queue:
+                await self._wakeup.wait()
+                self._wakeup.clear()
+                continue
+
+            delay = self._queue[0][0] - monotonic()
+            if delay > 0:
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), delay)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            if self._semaphore:
+                await self._semaphore.acquire()
+                if not self._queue or self._queue[0][0] > monotonic():
+                    # The due job was cancelled meanwhile
+                    self._semaphore.release()
+                    continue
+            _, _, job, key = heapq.heappop(self._queue)
+            task = asyncio.create_task(self._run_job(job, key))
+            self._tasks[task] = key
+            task.add_done_callback(self._on_done)
+
+    def _on_done(self, task: asyncio.Task):
+        # A task cancelled before it started never runs the body of _run_job, so the slot is released here
+        self._tasks.pop(task)
+        if self._semaphore:
+            self._semaphore.release()
+
+    async def _run_job(self, job: Job, key: Hashable):
+        next_delay = None
+        try:
+            next_delay = await job()
+        except Exception as error:
+            log_error(f"Scheduled job {getattr(job, '__qualname__', job)} failed: {error}")
+        if next_delay is not None:
+            self.schedule(job, next_delay, key)
@@ -1,26 +1,58 @@
 import aiohttp
 import asyncio
 import json
+from dataclasses import dataclass
 from urllib.parse import unquote, quote, parse_qs
 from aiocfscrape import CloudflareScraper
-from aiohttp_proxy import ProxyConnector
 from better_proxy import Proxy
-from time import time
+from time import time, perf_counter
+from functools import partial
 from random import randint, uniform
+from typing import Callable
 
 from bot.utils.universal_telegram_client import UniversalTelegramClient
 
 from bot.config import settings
 from bot.utils import logger, log_error, config_utils, CONFIG_PATH, first_run
-from bot.exceptions import InvalidSession
+from bot.utils.http_connectors import connectors
+from bot.utils.init_data_cache import InitDataCache
+from bot.utils.proxy_health import proxy_health
+from bot.utils.proxy_utils import PROXY_CHECK_URL
+from bot.exceptions import InvalidSession, TelegramFloodWait
 from .headers import *
+from .cycle_plan import CyclePlan, Step
+from .upgrade_planner import UpgradePlanner
+from .scheduler import Scheduler
 
 API_ENDPOINT = "https://tte.dogiators.com/api/v1"
+BOT_USERNAME = 'Dogiators_bot'
+WEB_DATA_STATS_INTERVAL = 3600
+
+
+@dataclass
+class WebDataStats:
+    """How often a cycle found valid init data (hit) or had to wait for Telegram to get it (miss)."""
+    hits: int = 0
+    misses: int = 0
+    refreshes: int = 0
+    failed_refreshes: int = 0
+
+    @property
+    def hit_rate(self) -> float:
+        total = self.hits + self.misses
+        return self.hits / total if total else 0
+
+
+web_data_stats = WebDataStats()
+init_data_cache = InitDataCache(BOT_USERNAME)
 
 
 class Tapper:
-    def __init__(self, tg_client: UniversalTelegramClient):
+    def __init__(self, tg_client: UniversalTelegramClient, on_first_request: Callable[[str], None] = None,
+                 scheduler: Scheduler = None):
         self.tg_client = tg_client
+        self.on_first_request = on_first_request
+        self.scheduler = scheduler
         self.session_name = tg_client.session_name
 
         session_config = config_utils.get_session_config(self.session_name, CONFIG_PATH)
@@ -43,6 +75,12 @@ class Tapper:
         self.ref_code = None
         self.referrals_count = 0
         self.tg_web_data = None
+        self.access_token_created_time = 0
+        self.token_live_time = 0
+        self._refresh_scheduled = False
+
+        self.http_client: CloudflareScraper | None = None
+        self.time_zone = None
 
         self._webview_data = None
 
@@ -50,7 +88,7 @@ class Tapper:
         return f"<ly>{self.session_name}</ly> | {message}"
 
     async def get_tg_web_data(self) -> str:
-        webview_url = await self.tg_client.get_app_webview_url('Dogiators_bot', "game", "s5XexnShM18Ftejz")
+        webview_url = await self.tg_client.get_app_webview_url(BOT_USERNAME, "game", "s5XexnShM18Ftejz")
 
         tg_web_data = unquote(string=webview_url.split('tgWebAppData=')[1].split('&tgWebAppVersion')[0])
         self.user_data = json.loads(parse_qs(tg_web_data).get('user', [''])[0])
@@ -59,33 +97,109 @@ class Tapper:
 
         self.tg_web_data = f"tg_data={quote(tg_web_data)}"
         self.ref_code = f'&referral_code={ref_id}' if ref_id else ""
+        self.access_token_created_time = time()
+        self.token_live_time = randint(3500, 3600)
+        init_data_cache.set(self.session_name, self.tg_web_data, self.user_data, self.ref_code,
+                            self.access_token_created_time, self.token_live_time)
+        self._schedule_web_data_refresh()
 
         return tg_web_data
 
+    def load_cached_tg_web_data(self) -> bool:
+        """Takes the init data saved by a previous run if it's still inside its live window."""
+        cached = init_data_cache.get(self.session_name)
+        if not cached:
+            return False
+        self.user_data = cached['user_data']
+        self.tg_web_data = cached['tg_web_data']
+        self.ref_code = cached['ref_code']
+        self.access_token_created_time = cached['created']
+        self.token_live_time = cached['live_time']
+        self.tg_client.is_fist_run = False
+        self._schedule_web_data_refresh()
+        return True
+
+    def forget_tg_web_data(self):
+        self.access_token_created_time = 0
+        init_data_cache.remove(self.session_name)
+
+    @property
+    def web_data_expires_in(self) -> float:
+        if not self.tg_web_data:
+            return 0
+        return self.access_token_created_time + self.token_live_time - time()
+
+    def _schedule_web_data_refresh(self):
+        if not self.scheduler or settings.TG_WEB_DATA_REFRESH_MARGIN <= 0 or self._refresh_scheduled:
+            return
+        self._refresh_scheduled = True
+        self.scheduler.schedule(self.refresh_tg_web_data,
+                                self.web_data_expires_in - settings.TG_WEB_DATA_REFRESH_MARGIN, self.session_name)
+
+    async def refresh_tg_web_data(self) -> float | None:
+        """Scheduler job: renews the init data TG_WEB_DATA_REFRESH_MARGIN seconds before it expires, so cycles
+        use fresh data without waiting for Telegram. The new data replaces the old one in a single step."""
+        if not self.tg_web_data:
+            self._refresh_scheduled = False
+            return None
+        due_in = self.web_data_expires_in - settings.TG_WEB_DATA_REFRESH_MARGIN
+        if due_in > 0:
+            return due_in
+
+        try:
+            await self.get_tg_web_data()
+        except TelegramFloodWait as error:
+            return error.seconds
+        except InvalidSession:
+            self._refresh_scheduled = False
+            return None
+        except Exception as error:
+            web_data_stats.failed_refreshes += 1
+            self._refresh_scheduled = False
+            log_error(self.log_message(f"Failed to refresh init data in background: {error}"))
+            return None
+        web_data_stats.refreshes += 1
+        return self.web_data_expires_in - settings.TG_WEB_DATA_REFRESH_MARGIN
+
     async def check_proxy(self, http_client: aiohttp.ClientSession) -> bool:
+        """The API requests keep the health of the proxy up to date, so the proxy is only checked when its
+        breaker is half-open or nothing went through it for PROXY_HEALTH_TTL seconds. An open breaker fails
+        right away."""
         proxy_conn = http_client.connector
         if proxy_conn and not hasattr(proxy_conn, '_proxy_host'):
             logger.info(self.log_message(f"Running Proxy-less"))
             return True
+        state = proxy_health.state(self.proxy)
+        if state == proxy_health.OPEN:
+            logger.warning(self.log_message(f"Proxy failed {proxy_health.get(self.proxy).get('failures')} times "
+                                            f"in a row. Not using it for now"))
+            return False
+        last_success = proxy_health.get(self.proxy).get('last_success', 0)
+        if state == proxy_health.CLOSED and time() - last_success < proxy_health.ttl:
+            logger.info(self.log_message(f"Proxy IP: {proxy_health.get(self.proxy).get('ip')} (cached)"))
+            return True
         try:
-            response = await http_client.get(url='https://ifconfig.me/ip', timeout=aiohttp.ClientTimeout(15))
-            logger.info(self.log_message(f"Proxy IP: {await response.text()}"))
+            start = perf_counter()
+            response = await http_client.get(url=PROXY_CHECK_URL, timeout=aiohttp.ClientTimeout(15))
+            proxy_ip = (await response.text()).strip()
+            proxy_health.record_success(self.proxy, perf_counter() - start, proxy_ip)
+            logger.info(self.log_message(f"Proxy IP: {proxy_ip}"))
             return True
         except Exception as error:
+            proxy_health.record_failure(self.proxy)
             proxy_url = f"{proxy_conn._proxy_type}://{proxy_conn._proxy_host}:{proxy_conn._proxy_port}"
             log_error(self.log_message(f"Proxy: {proxy_url} | Error: {type(error).__name__}"))
             return False
 
-    @staticmethod
-    async def get_time_zone(http_client: aiohttp.ClientSession):
+    async def get_time_zone(self, http_client: aiohttp.ClientSession):
         try:
-            resp = await http_client.get("http://ip-api.com/json/")
-            return (await resp.json())['timezone']
-        except:
+            return await proxy_health.get_time_zone(self.proxy, http_client)
+        except Exception as error:
+            logger.warning(self.log_message(f"Failed to get the time zone of the exit IP: {type(error).__name__}. "
+                                            f"Using Europe/Berlin"))
             return "Europe/Berlin"
 
     async def get_quests(self, http_client: aiohttp.ClientSession):
-        await asyncio.sleep(uniform(1, 3))
         response = await http_client.get(url=f"{API_ENDPOINT}/quests/info?{self.tg_web_data}{self.ref_code}",
                                          headers=QUESTS_REFERER)
         if response.status == 200:
@@ -97,7 +211,6 @@ class Tapper:
             return None
 
     async def get_user_profile(self, http_client: aiohttp.ClientSession, time_zone: str):
-        await asyncio.sleep(uniform(1, 3))
         response = await http_client.post(f'{API_ENDPOINT}/profile/init?{self.tg_web_data}{self.ref_code}',
                                           json={"taps": 0, "profit": 0, "ts": 0, "timezone": time_zone})
         if response.status == 200:
@@ -145,11 +258,7 @@ class Tapper:
                                      'perform:single_fight']:
             return
 
-        if quest.get('type', "") == "subscribe:telegram" and settings.CHANNEL_SUBSCRIBE_TASKS:
-            if quest.get('link'):
-                await self.tg_client.join_and_mute_tg_channel(quest.get('link'))
-                await asyncio.sleep(uniform(15, 20))
-        elif quest.get('type', "") == "subscribe:telegram" and not settings.CHANNEL_SUBSCRIBE_TASKS:
+        if quest.get('type', "") == "subscribe:telegram" and not settings.CHANNEL_SUBSCRIBE_TASKS:
             return
         await asyncio.sleep(uniform(2, 5))
         quest_reward = await http_client.post(
@@ -165,6 +274,41 @@ class Tapper:
 
         return
 
+    async def join_quest_channels(self, quests: list[dict]) -> set[str]:
+        """Joins the channels of all telegram subscription quests. The joins are queued at once, so they run
+        in a single Telegram connection. Joins hit by a FloodWait are retried by the scheduler after it ends.
+
+         Returns:
+           Links of the channels that weren't joined because of a FloodWait.
+         """
+        links = [quest.get('link') for quest in quests
+                 if quest.get('type', "") == "subscribe:telegram" and quest.get('link')]
+        if not links or not settings.CHANNEL_SUBSCRIBE_TASKS:
+            return set()
+        results = await asyncio.gather(*(self.tg_client.join_and_mute_tg_channel(link) for link in links),
+                                       return_exceptions=True)
+        deferred = set()
+        for link, result in zip(links, results):
+            if isinstance(result, TelegramFloodWait):
+                deferred.add(link)
+                if self.scheduler:
+                    self.scheduler.schedule(partial(self.join_channel_later, link), result.seconds,
+                                            self.session_name)
+            elif isinstance(result, BaseException):
+                raise result
+        await asyncio.sleep(uniform(15, 20))
+        return deferred
+
+    async def join_channel_later(self, link: str) -> float | None:
+        """Scheduler job: retries a channel join deferred by a FloodWait. The quest is claimed on the next cycle."""
+        try:
+            await self.tg_client.join_and_mute_tg_channel(link)
+        except TelegramFloodWait as error:
+            return error.seconds
+        except InvalidSession:
+            pass
+        return None
+
     async def complete_onboarding(self, http_client: aiohttp.ClientSession):
         payload = {"is_onboarded": True}
         response = await http_client.patch(f"{API_ENDPOINT}/profile/update?{self.tg_web_data}{self.ref_code}",
@@ -175,7 +319,6 @@ class Tapper:
         return resp_json.get('result', {}).get("profile", {}).get("is_onboarded", False)
 
     async def get_upgrades_list(self, http_client: aiohttp.ClientSession):
-        await asyncio.sleep(uniform(2, 5))
         response = await http_client.get(f"{API_ENDPOINT}/upgrade/list?{self.tg_web_data}{self.ref_code}",
                                          headers=UPGRADE_REFERER)
         if response.status in range(200, 300):
@@ -187,15 +330,17 @@ class Tapper:
                 self.log_message(f"Failed to grab list of upgrades. {response.status}. {await response.text()}"))
             return {}
 
-    async def upgrade_card(self, http_client: aiohttp.ClientSession, upgrade_id: int) -> bool:
+    async def upgrade_card(self, http_client: aiohttp.ClientSession, upgrade_id: int) -> dict | None:
+        """Returns the result of the purchase (empty if the response has none), or None if it failed."""
         await asyncio.sleep(uniform(1, 3))
         response = await http_client.post(f"{API_ENDPOINT}/upgrade/buy?{self.tg_web_data}{self.ref_code}",
                                           json={"upgrade_id": upgrade_id}, headers=UPGRADE_REFERER)
         if response.status == 200:
             resp_json = await response.json()
             if resp_json.get('status', False):
-                return True
-        return False
+                result = resp_json.get('result')
+                return result if isinstance(result, dict) else {}
+        return None
 
     async def fighting_store(self, http_client: aiohttp.ClientSession):
         resp = await http_client.get(f"{API_ENDPOINT}/fighting/store/info?{self.tg_web_data}{self.ref_code}",
@@ -203,149 +348,203 @@ class Tapper:
         if resp.status in range(200, 300):
             return (await resp.json()).get('result')
 
-    @staticmethod
-    async def select_best_upgrade(json_object, available_money):
-        upgrades = json_object.get('system_upgrades', [{}]) + json_object.get('special_upgrades', [{}]) + \
-                   json_object.get('arena_upgrades', [{}])
+    def get_cycle_reads(self) -> list[Step]:
+        """Reads at the start of a cycle: the profile first, then quests and upgrades together."""
+        steps = [Step('profile', lambda _: self.get_user_profile(self.http_client, self.time_zone), required=True)]
+        if settings.PERFORM_QUESTS:
+            steps.append(Step('quests', lambda _: self.get_quests(self.http_client), after=('profile',)))
+        if settings.UPGRADE_CARDS:
+            steps.append(Step('upgrades', lambda _: self.get_upgrades_list(self.http_client), after=('profile',)))
+        return steps
+
+    def get_upgrade_reads(self, refresh_upgrades: bool = True) -> list[Step]:
+        steps = [Step('profile', lambda _: self.get_user_profile(self.http_client, self.time_zone), required=True)]
+        if refresh_upgrades:
+            steps.append(Step('upgrades', lambda _: self.get_upgrades_list(self.http_client)))
+        return steps
+
+    def get_start_delay(self) -> float:
+        random_delay = uniform(1, settings.SESSION_START_DELAY)
+        logger.info(self.log_message(f"Bot will start in <light-red>{int(random_delay)}s</light-red>"))
+        return random_delay
+
+    async def close(self):
+        if self.http_client and not self.http_client.closed:
+            await self.http_client.close()
+        self.http_client = None
+
+    async def stop(self):
+        """Cancels the scheduled jobs of the session, including a running cycle, and closes its HTTP session.
+        An idle Telegram connection is closed by the connection manager."""
+        if self.scheduler:
+            self.scheduler.cancel(self.session_name)
+        await self.close()
+
+    async def run_cycle(self) -> float:
+        """Runs one farming cycle.
+
+         Returns:
+           Delay in seconds until the next cycle.
+         """
+        if not self.http_client:
+            trace_configs = [proxy_health.trace_config(self.proxy)] if self.proxy else None
+            self.http_client = CloudflareScraper(headers=self.headers, timeout=aiohttp.ClientTimeout(60),
+                                                 connector=connectors.get(self.proxy), connector_owner=False,
+                                                 trace_configs=trace_configs)
+            self.time_zone = await self.get_time_zone(self.http_client)
+
+        if not await self.check_proxy(http_client=self.http_client):
+            logger.warning(self.log_message('Failed to connect to proxy server. Sleep 5 minutes.'))
+            return 300
 
-        best_upgrade_id = None
-        upgrade_title = None
-        best_efficiency = 0
+        try:
+            if not self.access_token_created_time and self.load_cached_tg_web_data():
+                logger.info(self.log_message("Using init data from the previous run"))
+            if self.web_data_expires_in <= 0:
+                web_data_stats.misses += 1
+                if not await self.get_tg_web_data():
+                    logger.warning(self.log_message('Failed to get webview URL'))
+                    return 300
+            else:
+                web_data_stats.hits += 1
 
-        for upgrade in upgrades:
-            if upgrade.get('status', 'locked').lower() not in ['active', 'inactive']:
-                continue
+            cycle_start = perf_counter()
+            reads = await CyclePlan(self.get_cycle_reads()).run()
+            profile = reads.get('profile')
+            if profile:
+                if self.on_first_request:
+                    self.on_first_request(self.session_name)
+                    self.on_first_request = None
+                if self.tg_client.is_fist_run:
+                    await first_run.append_recurring_session(self.session_name)
+                    self.tg_client.is_fist_run = False
+                logger.success(self.log_message(f"Balance <lc>{int(profile['balance'])}</lc> "
+                                                f"Level <lc>{profile['level']}</lc> "
+                                                f"Profit per hour <lc>{profile['profit_per_hour']}</lc> "
+                                                f"Spins <lc>{profile['lottery_tickets']}</lc>"))
+            else:
+                self.forget_tg_web_data()
+                logger.error(self.log_message(f"Failed to get profile data. Sleep 5 minutes"))
+                return 300
+
+            if not profile.get("is_onboarded", False):
+                if await self.complete_onboarding(self.http_client):
+                    logger.info(self.log_message("Successfully completed onboarding"))
+
+            if settings.SPIN_THE_WHEEL:
+                tickets = profile.get('lottery_tickets', 0)
+                for i in range(tickets):
+                    await self.spin_wheel_of_fortune(self.http_client)
+
+            quests = reads.get('quests') or {}
+
+            if settings.PERFORM_QUESTS:
+                daily = quests.get('daily_rewards', {}).get('reward_days', {})
+                subscribe = quests.get('subscriptions_state', {})
+                for day in daily:
+                    if day.get('is_current', False):
+                        if not day.get('is_completed', True):
+                            daily_result = await self.perform_daily_checkin(self.http_client)
+                            if daily_result:
+                                logger.success(self.log_message(f"Successfully claimed daily reward: "
+                                                                f"<lc>{day.get('value')}</lc> coins"))
+                            else:
+                                logger.warning(self.log_message("Failed to claim daily reward"))
+                        break
+
+                subscribe = [task for task in subscribe if not task.get('is_completed', False)]
+                deferred = await self.join_quest_channels(subscribe)
+                for task in subscribe:
+                    if task.get('link') in deferred:
+                        continue
+                    await self.perform_subscribe_quest(self.http_client, task)
 
-            next_modifier = upgrade.get('next_modifier', {})
-            price = next_modifier.get('price', 2**128)
-            profit_relative = next_modifier.get('profit_per_hour_relative', 0)
+            if settings.UPGRADE_CARDS:
+                try:
+                    # Purchases are planned from one snapshot, the server is read again only when the next level
+                    # of a bought card isn't in the buy response or a purchase doesn't go as predicted
+                    planner = None
+                    failed = set()
+                    upgrades_list = reads.get('upgrades')
+                    while True:
+                        if planner is None:
+                            reads = await CyclePlan(self.get_upgrade_reads(refresh_upgrades=not upgrades_list)).run()
+                            upgrades_list = upgrades_list or reads.get('upgrades')
+                            if not reads.get('profile') or not upgrades_list:
+                                break
+                            profile = reads['profile']
+                            self.referrals_count = profile.get("referrals_count", 0)
+                            planner = UpgradePlanner(upgrades_list, profile.get('balance', 0), excluded=failed)
+                            upgrades_list = None
+
+                        upgrade = planner.next_purchase()
+                        if not upgrade:
+                            if not planner.needs_sync:
+                                break
+                            planner = None
+                            continue
 
-            if price > available_money:
-                continue
+                        upgrade_title = planner.describe(upgrade)
+                        upgrade_result = await self.upgrade_card(self.http_client, upgrade['id'])
+                        if upgrade_result is None:
+                            logger.error(self.log_message(f"Failed to upgrade <lc>{upgrade_title}</lc>"))
+                            failed.add(upgrade['id'])
+                            planner = None
+                            continue
 
-            efficiency = profit_relative / price
-            if efficiency > best_efficiency:
-                best_efficiency = efficiency
-                best_upgrade_id = upgrade['id']
-                upgrade_title = f"{upgrade['title']} Level: {next_modifier.get('level')}"
+                        logger.success(self.log_message(f"Successfully upgraded <lc>{upgrade_title}</lc>"))
+                        if not planner.apply(upgrade, upgrade_result):
+                            planner = None
+                except KeyError:
+                    log_error(self.log_message("Failed to upgrade a card. Done upgrading."))
+                    pass
+
+            sleep_time = uniform(settings.RANDOM_SLEEP_TIME[0], settings.RANDOM_SLEEP_TIME[1])
+            logger.info(self.log_message(f"Balance <lc>{int(profile['balance'])}</lc> "
+                                         f"Level <lc>{profile['level']}</lc> "
+                                         f"Profit per hour <lc>{profile['profit_per_hour']}</lc> "
+                                         f"Spins <lc>{profile['lottery_tickets']}</lc>"))
+            logger.info(self.log_message(f"Completed cycle in {int(perf_counter() - cycle_start)}s. "
+                                         f"waiting {int(sleep_time)} seconds..."))
+            return sleep_time
+
+        except InvalidSession as error:
+            raise error
+
+        except TelegramFloodWait as error:
+            logger.warning(self.log_message(f"Telegram asked to wait {error.seconds}s. "
+                                            f"Next cycle in {error.seconds}s"))
+            return error.seconds
 
-        return best_upgrade_id, upgrade_title
+        except Exception as error:
+            sleep_time = uniform(60, 120)
+            log_error(self.log_message(f"Unknown error: {error}. Sleep {int(sleep_time)} seconds"))
+            return sleep_time
 
-    async def run(self) -> None:
-        random_delay = uniform(1, settings.SESSION_START_DELAY)
-        logger.info(self.log_message(f"Bot will start in <light-red>{int(random_delay)}s</light-red>"))
-        await asyncio.sleep(delay=random_delay)
-
-        access_token_created_time = 0
-        tg_web_data = None
-
-        proxy_conn = {'connector': ProxyConnector.from_url(self.proxy)} if self.proxy else {}
-        async with CloudflareScraper(headers=self.headers, timeout=aiohttp.ClientTimeout(60),
-                                     **proxy_conn) as http_client:
-            time_zone = await self.get_time_zone(http_client)
-            while True:
-                if not await self.check_proxy(http_client=http_client):
-                    logger.warning(self.log_message('Failed to connect to proxy server. Sleep 5 minutes.'))
-                    await asyncio.sleep(300)
-                    continue
-                token_live_time = randint(3500, 3600)
-                try:
-                    if time() - access_token_created_time >= token_live_time or not tg_web_data:
-                        tg_web_data = await self.get_tg_web_data()
+    async def scheduled_cycle(self) -> float | None:
+        """Scheduler job: runs a cycle and returns the delay until the next one, or None if the session is invalid."""
+        try:
+            return await self.run_cycle()
+        except InvalidSession as e:
+            logger.error(self.log_message(f"Invalid Session: {e}"))
+            self.tg_web_data = None
+            init_data_cache.remove(self.session_name)
+            await self.close()
+            return None
 
-                        if not tg_web_data:
-                            logger.warning(self.log_message('Failed to get webview URL'))
-                            await asyncio.sleep(300)
-                            continue
 
-                        access_token_created_time = time()
-
-                    profile = await self.get_user_profile(http_client, time_zone)
-                    if profile:
-                        if self.tg_client.is_fist_run:
-                            await first_run.append_recurring_session(self.session_name)
-                        logger.success(self.log_message(f"Balance <lc>{int(profile['balance'])}</lc> "
-                                                        f"Level <lc>{profile['level']}</lc> "
-                                                        f"Profit per hour <lc>{profile['profit_per_hour']}</lc> "
-                                                        f"Spins <lc>{profile['lottery_tickets']}</lc>"))
-                    else:
-                        logger.error(self.log_message(f"Failed to get profile data. Sleep 5 minutes"))
-                        await asyncio.sleep(300)
-                        continue
+def schedule_tapper(scheduler: Scheduler, tg_client: UniversalTelegramClient,
+                    on_first_request: Callable[[str], None] = None) -> Tapper:
+    """Creates a Tapper and schedules its cycles on the central scheduler, starting after the random start delay."""
+    runner = Tapper(tg_client=tg_client, on_first_request=on_first_request, scheduler=scheduler)
+    scheduler.schedule(runner.scheduled_cycle, runner.get_start_delay(), runner.session_name)
+    return runner
 
-                    if not profile.get("is_onboarded", False):
-                        if await self.complete_onboarding(http_client):
-                            logger.info(self.log_message("Successfully completed onboarding"))
-
-                    if settings.SPIN_THE_WHEEL:
-                        tickets = profile.get('lottery_tickets', 0)
-                        for i in range(tickets):
-                            await self.spin_wheel_of_fortune(http_client)
-
-                    quests = await self.get_quests(http_client)
-
-                    if settings.PERFORM_QUESTS:
-                        daily = quests.get('daily_rewards', {}).get('reward_days', {})
-                        subscribe = quests.get('subscriptions_state', {})
-                        for day in daily:
-                            if day.get('is_current', False):
-                                if not day.get('is_completed', True):
-                                    daily_result = await self.perform_daily_checkin(http_client)
-                                    if daily_result:
-                                        logger.success(self.log_message(f"Successfully claimed daily reward: "
-                                                                        f"<lc>{day.get('value')}</lc> coins"))
-                                    else:
-                                        logger.warning(self.log_message("Failed to claim daily reward"))
-                                break
 
-                        for task in subscribe:
-                            if not task.get('is_completed', False):
-                                await self.perform_subscribe_quest(http_client, task)
-
-                    if settings.UPGRADE_CARDS:
-                        try:
-                            can_upgrade = True
-                            while can_upgrade:
-                                profile = await self.get_user_profile(http_client, time_zone)
-                                upgrades_list = await self.get_upgrades_list(http_client)
-                                if not profile or not upgrades_list:
-                                    break
-                                self.referrals_count = profile.get("referrals_count", 0)
-                                balance = profile.get('balance', 0)
-                                get_upgrade_id, get_upgrade_title = await self.select_best_upgrade(upgrades_list, balance)
-                                if get_upgrade_id:
-                                    upgrade_result = await self.upgrade_card(http_client, get_upgrade_id)
-                                    if upgrade_result:
-                                        logger.success(
-                                            self.log_message(f"Successfully upgraded <lc>{get_upgrade_title}</lc>"))
-                                    else:
-                                        logger.error(self.log_message(f"Failed to upgrade <lc>{get_upgrade_title}</lc>"))
-                                else:
-                                    can_upgrade = False
-                        except KeyError:
-                            log_error(self.log_message("Failed to upgrade a card. Done upgrading."))
-                            pass
-
-                    sleep_time = uniform(settings.RANDOM_SLEEP_TIME[0], settings.RANDOM_SLEEP_TIME[1])
-                    logger.info(self.log_message(f"Balance <lc>{int(profile['balance'])}</lc> "
-                                                 f"Level <lc>{profile['level']}</lc> "
-                                                 f"Profit per hour <lc>{profile['profit_per_hour']}</lc> "
-                                                 f"Spins <lc>{profile['lottery_tickets']}</lc>"))
-                    logger.info(self.log_message(f"Completed cycle. waiting {int(sleep_time)} seconds..."))
-                    await asyncio.sleep(delay=sleep_time)
-
-                except InvalidSession as error:
-                    raise error
-
-                except Exception as error:
-                    sleep_time = uniform(60, 120)
-                    log_error(self.log_message(f"Unknown error: {error}. Sleep {int(sleep_time)} seconds"))
-                    await asyncio.sleep(delay=sleep_time)
-
-
-async def run_tapper(tg_client: UniversalTelegramClient):
-    runner = Tapper(tg_client=tg_client)
-    try:
-        await runner.run()
-    except InvalidSession as e:
-        logger.error(runner.log_message(f"Invalid Session: {e}"))
+async def log_web_data_stats() -> float:
+    """Scheduler job: logs how often cycles had valid init data ready."""
+    if web_data_stats.hits or web_data_stats.misses:
+        logger.info(f"Init data | hits <lc>{web_data_stats.hits}</lc> misses <lc>{web_data_stats.misses}</lc> "
+                    f"({web_data_stats.hit_rate:.0%} hit rate), background refreshes "
+                    f"<lc>{web_data_stats.refreshes}</lc>, failed <lc>{web_data_stats.failed_refreshes}</lc>")
+    return WEB_DATA_STATS_INTERVAL
@@ -0,0 +1,70 @@
+UPGRADE_GROUPS = ('system_upgrades', 'special_upgrades', 'arena_upgrades')
+
+
+class UpgradePlanner:
+    """Plans card purchases locally from one upgrades snapshot and the balance.
+
+    The best affordable card by profit per coin of its `next_modifier` is bought next, and its price is taken
+    off the predicted balance. The snapshot only has the next level of each card: the level after it is known
+    only if the buy response has the updated card (`result.upgrade`). Otherwise the bought card could still be
+    the best one, so no other card is picked until a sync (`needs_sync`), which keeps the same choices as
+    reading the upgrades after every buy. `apply` returns False when the response disagrees with the prediction.
+    """
+
+    BALANCE_TOLERANCE = 1
+
+    def __init__(self, upgrades_list: dict, balance: float, excluded: set = None):
+        self.balance = balance
+        self.upgrades = {upgrade['id']: upgrade for group in UPGRADE_GROUPS
+                         for upgrade in upgrades_list.get(group) or [] if upgrade.get('id') is not None}
+        self.excluded = excluded if excluded is not None else set()
+        self.unknown: set = set()
+
+    @property
+    def needs_sync(self) -> bool:
+        return bool(self.unknown)
+
+    def next_purchase(self) -> dict | None:
+        """The next card to buy, or None if there's none or the upgrades have to be read again first."""
+        if self.unknown:
+            return None
+        best_upgrade = None
+        best_efficiency = 0
+        for upgrade_id, upgrade in self.upgrades.items():
+            if upgrade_id in self.excluded:
+                continue
+            if upgrade.get('status', 'locked').lower() not in ['active', 'inactive']:
+                continue
+
+            next_modifier = upgrade.get('next_modifier') or {}
+            price = next_modifier.get('price', 2**128)
+            if price > self.balance:
+                continue
+
+            efficiency = next_modifier.get('profit_per_hour_relative', 0) / price if price else 0
+            if efficiency > best_efficiency:
+                best_efficiency = efficiency
+                best_upgrade = upgrade
+        return best_upgrade
+
+    def apply(self, upgrade: dict, result: dict) -> bool:
+        """Updates the prediction with a successful purchase. Returns False if the server state disagrees."""
+        self.balance -= upgrade['next_modifier']['price']
+
+        updated_upgrade = result.get('upgrade') if isinstance(result, dict) else None
+        if isinstance(updated_upgrade, dict) and updated_upgrade.get('id') == upgrade['id'] \
+                and updated_upgrade.get('next_modifier') != upgrade.get('next_modifier'):
+            self.upgrades[upgrade['id']] = updated_upgrade
+        else:
+            self.unknown.add(upgrade['id'])
+
+        profile = result.get('profile') if isinstance(result, dict) else None
+        if isinstance(profile, dict) and 'balance' in profile:
+            if profile['balance'] < self.balance - self.BALANCE_TOLERANCE:
+                return False
+            self.balance = profile['balance']
+        return True
+
+    @staticmethod
+    def describe(upgrade: dict) -> str:
+        return f"{upgrade.get('title')} Level: {(upgrade.get('next_modifier') or {}).get('level')}"
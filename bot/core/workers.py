@@ -0,0 +1,193 @@
+import asyncio
+import multiprocessing
+import os
+import queue
+from contextlib import suppress
+from time import time
+
+from bot.config import settings
+from bot.core.launcher import get_sessions, get_shard_leases, create_tg_client, iter_session_configs
+from bot.core.scheduler import Scheduler
+from bot.core.tapper import schedule_tapper, log_web_data_stats, WEB_DATA_STATS_INTERVAL
+from bot.utils import logger, log_error, config_utils, first_run, build_check, CONFIG_PATH, SESSIONS_PATH, PROXY_CHAIN
+from bot.utils.http_connectors import connectors
+from bot.utils.tg_connections import connection_manager
+from bot.utils.proxy_utils import read_proxy_chain, set_proxy_chain
+from bot.utils.sharding import Shard
+from bot.utils.tg_admission import telegram_admission, STATS_INTERVAL as ADMISSION_STATS_INTERVAL
+
+STATUS_INTERVAL = 60
+RESTART_DELAY = 10
+
+
+class WorkerHandle:
+    """Coordinator side of a worker process: the process, its inbox and the sessions assigned to it."""
+
+    def __init__(self, worker_id: int, context, status_queue):
+        self.worker_id = worker_id
+        self.context = context
+        self.status_queue = status_queue
+        self.sessions: list[tuple[str, dict]] = []
+        self.status: dict = {}
+        self.restarts = 0
+        self.inbox = None
+        self.process = None
+
+    def start(self):
+        self.inbox = self.context.Queue()
+        self.process = self.context.Process(target=worker_process, name=f"worker-{self.worker_id}", daemon=True,
+                                            args=(self.worker_id, self.inbox, self.status_queue))
+        self.process.start()
+        for session in self.sessions:
+            self.inbox.put(session)
+
+    def restart(self):
+        self.restarts += 1
+        self.status = {}
+        self.start()
+
+    def assign(self, session: str, session_config: dict):
+        self.sessions.append((session, session_config))
+        self.inbox.put((session, session_config))
+
+    def unassign(self, sessions: set[str]):
+        """Stops the given sessions in the worker. A session sent with no config is stopped."""
+        for item in [item for item in self.sessions if item[0] in sessions]:
+            self.sessions.remove(item)
+            self.inbox.put((item[0], None))
+
+    def stop(self):
+        if self.process and self.process.is_alive():
+            self.process.terminate()
+            self.process.join(5)
+
+
+def worker_process(worker_id: int, inbox, status_queue):
+    """Entry point of a worker process. Spawned workers don't run main(), so the proxy chain the coordinator
+    checked at startup is applied here."""
+    if PROXY_CHAIN:
+        _, proxy = read_proxy_chain(PROXY_CHAIN)
+        if proxy:
+            set_proxy_chain(proxy)
+    with suppress(KeyboardInterrupt):
+        asyncio.run(run_worker(worker_id, inbox, status_queue))
+
+
+async def run_worker(worker_id: int, inbox, status_queue):
+    """Runs the sessions sent by the coordinator on this process' own event loop."""
+    scheduler = Scheduler(settings.MAX_ACTIVE_CYCLES)
+    scheduler.schedule(log_web_data_stats, WEB_DATA_STATS_INTERVAL)
+    scheduler.schedule(telegram_admission.log_stats, ADMISSION_STATS_INTERVAL)
+    scheduler_task = asyncio.create_task(scheduler.run())
+    store = config_utils.get_config_store(CONFIG_PATH)
+    runners = {}
+    last_report = 0
+
+    try:
+        while not scheduler_task.done():
+            if time() - last_report >= STATUS_INTERVAL / 2:
+                last_report = time()
+                status_queue.put({'worker': worker_id, 'pid': os.getpid(), 'sessions': len(runners),
+                                  'active': scheduler.active, 'pending': scheduler.pending})
+            try:
+                session, session_config = await asyncio.to_thread(inbox.get, timeout=1)
+            except queue.Empty:
+                continue
+            try:
+                if session_config is None:
+                    runner = runners.pop(os.path.basename(session), None)
+                    if runner:
+                        await runner.stop()
+                    continue
+                store.load_session(os.path.basename(session), session_config)
+                tg_client = create_tg_client(session, session_config)
+                runners[tg_client.session_name] = schedule_tapper(scheduler, tg_client)
+            except Exception as error:
+                log_error(f"Worker #{worker_id} | Failed to start session {os.path.basename(session)}: {error}")
+        await scheduler_task
+    finally:
+        await config_utils.flush_config_stores()
+        await connectors.close_all()
+        await connection_manager.close_all()
+
+
+async def monitor_workers(workers: list[WorkerHandle], status_queue):
+    """Collects status reports, logs a summary and restarts workers that died."""
+    last_summary = time()
+    while True:
+        await asyncio.sleep(1)
+        with suppress(queue.Empty):
+            while True:
+                status = status_queue.get_nowait()
+                workers[status['worker']].status = status
+
+        for worker in workers:
+            if worker.process.is_alive():
+                continue
+            logger.error(f"Worker #{worker.worker_id} (pid {worker.process.pid}) exited with code "
+                         f"{worker.process.exitcode}. Restarting it with {len(worker.sessions)} sessions "
+                         f"in {RESTART_DELAY}s")
+            await asyncio.sleep(RESTART_DELAY)
+            worker.restart()
+
+        if time() - last_summary >= STATUS_INTERVAL:
+            last_summary = time()
+            logger.info("Workers | " + " | ".join(
+                f"#{worker.worker_id}: {worker.status.get('sessions', 0)}/{len(worker.sessions)} sessions, "
+                f"{worker.status.get('active', 0)} active, restarts {worker.restarts}" for worker in workers))
+
+
+async def run_workers(workers_count: int, shard: Shard = None):
+    """Coordinator: prepares sessions and binds proxies like run_tasks, then hands every prepared session
+    to one of `workers_count` worker processes, each running its own event loop, HTTP sessions and Telegram
+    clients. Config writes of the workers go through the config store and its inter-process lock."""
+    context = multiprocessing.get_context('spawn')
+    status_queue = context.Queue()
+    workers = [WorkerHandle(worker_id, context, status_queue) for worker_id in range(workers_count)]
+    sessions_count = 0
+
+    async def distribute_sessions(session_paths: list[str]):
+        nonlocal sessions_count
+        async for session, session_config in iter_session_configs(session_paths):
+            # The shard may have been handed back while its sessions were being prepared
+            if shard and not shard.owns(session):
+                continue
+            workers[sessions_count % workers_count].assign(session, session_config)
+            sessions_count += 1
+        logger.info(f"Distributed {sessions_count} sessions between {workers_count} workers")
+
+    async def take_over_shard(index: int):
+        await distribute_sessions(get_sessions(SESSIONS_PATH, shard, index))
+
+    async def stop_shard(index: int):
+        sessions = set(get_sessions(SESSIONS_PATH, shard, index))
+        for worker in workers:
+            worker.unassign(sessions)
+
+    leases = get_shard_leases(shard) if shard else None
+    try:
+        await config_utils.restructure_config(CONFIG_PATH)
+        await first_run.compact()
+        if leases:
+            await leases.acquire()
+        session_paths = get_sessions(SESSIONS_PATH, shard)
+        if not session_paths:
+            raise FileNotFoundError("Session files not found")
+        await build_check.check_base_url()
+
+        for worker in workers:
+            worker.start()
+        logger.info(f"Started {workers_count} workers")
+        tasks = [asyncio.create_task(monitor_workers(workers, status_queue)),
+                 asyncio.create_task(build_check.check_bot_update_loop(2000))]
+        if leases:
+            tasks.append(asyncio.create_task(leases.keep_alive(take_over_shard, stop_shard)))
+
+        await distribute_sessions(session_paths)
+        await asyncio.gather(*tasks)
+    finally:
+        if leases:
+            leases.release()
+        await config_utils.flush_config_stores()
+        for worker in workers:
+            worker.stop()
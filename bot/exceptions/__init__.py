@@ -1,2 +1,15 @@
+from time import time
+
+
 class InvalidSession(BaseException):
     ...
+
+
+class TelegramFloodWait(Exception):
+    """Telegram asked the session to wait `seconds` before the next request. The operation should be run
+    again after `until` instead of waiting for it in place."""
+
+    def __init__(self, seconds: int):
+        super().__init__(f"FloodWait {seconds}s")
+        self.seconds = seconds
+        self.until = time() + seconds
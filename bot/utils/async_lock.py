@@ -1,29 +1,139 @@
 import asyncio
-import fasteners
+import os
+import sys
+from dataclasses import dataclass
 from random import uniform
-from os import path
+from time import monotonic, sleep
 
 from bot.utils import logger
 
+if sys.platform == 'win32':
+    import msvcrt
+else:
+    import fcntl
+
+
+@dataclass
+class LockStats:
+    acquisitions: int = 0
+    contended: int = 0
+    total_wait: float = 0
+    max_wait: float = 0
+
+    @property
+    def average_wait(self) -> float:
+        return self.total_wait / self.acquisitions if self.acquisitions else 0
+
+    def record(self, wait: float, contended: bool):
+        self.acquisitions += 1
+        self.contended += contended
+        self.total_wait += wait
+        self.max_wait = max(self.max_wait, wait)
+
 
 class AsyncInterProcessLock:
-    """A context manager for acquiring inter-process locks asynchronously."""
+    """A context manager for acquiring inter-process locks asynchronously.
+
+    The file lock is only ever tried in non-blocking mode (lockf on POSIX, msvcrt.locking on Windows -
+    the same locks fasteners uses, so processes of other bots sharing the lock files still exclude each other).
+    While another process holds it, the coroutine waits on the event loop with exponential backoff, so no
+    threads are parked. Holders from the same process queue on an asyncio.Lock instead of polling the file.
+    """
+
+    _local_locks: dict[str, asyncio.Lock] = {}
+    _stats: dict[str, LockStats] = {}
+
+    MIN_BACKOFF = 0.01
+    MAX_BACKOFF = 0.5
 
     def __init__(self, lock_file):
-        self.lock = fasteners.InterProcessLock(lock_file)
-        self.file_name, _ = path.splitext(path.basename(lock_file))
+        self.lock_file = os.path.abspath(lock_file)
+        self.file_name, _ = os.path.splitext(os.path.basename(lock_file))
+        self._fd = None
+
+    @property
+    def local_lock(self) -> asyncio.Lock:
+        return self._local_locks.setdefault(self.lock_file, asyncio.Lock())
+
+    @property
+    def stats(self) -> LockStats:
+        return self._stats.setdefault(self.lock_file, LockStats())
+
+    @classmethod
+    def get_stats(cls) -> dict[str, LockStats]:
+        """Wait time statistics per lock file."""
+        return dict(cls._stats)
+
+    def _try_acquire(self) -> bool:
+        if self._fd is None:
+            os.makedirs(os.path.dirname(self.lock_file), exist_ok=True)
+            self._fd = os.open(self.lock_file, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            if sys.platform == 'win32':
+                os.lseek(self._fd, 0, os.SEEK_SET)
+                msvcrt.locking(self._fd, msvcrt.LK_NBLCK, 1)
+            else:
+                fcntl.lockf(self._fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            return True
+        except OSError:
+            return False
+
+    def _release(self):
+        if self._fd is None:
+            return
+        try:
+            if sys.platform == 'win32':
+                os.lseek(self._fd, 0, os.SEEK_SET)
+                msvcrt.locking(self._fd, msvcrt.LK_UNLCK, 1)
+            else:
+                fcntl.lockf(self._fd, fcntl.LOCK_UN)
+        finally:
+            os.close(self._fd)
+            self._fd = None
 
     async def __aenter__(self):
-        while True:
-            lock_acquired = await asyncio.to_thread(self.lock.acquire, timeout=uniform(5, 10))
-            if lock_acquired:
-                return self
-            sleep_time = uniform(30, 150)
-            logger_message = f"<LY><k>{self.file_name}</k></LY> | Failed to acquire lock for " \
-                             f"{'accounts_config' if 'accounts_config' in self.file_name else 'session'}. " \
-                             f"Retrying in {int(sleep_time)} seconds"
-            logger.info(logger_message)
-            await asyncio.sleep(sleep_time)
+        start = monotonic()
+        local_lock = self.local_lock
+        await local_lock.acquire()
+        contended = monotonic() - start > self.MIN_BACKOFF
+        try:
+            while True:
+                deadline = monotonic() + uniform(5, 10)
+                backoff = self.MIN_BACKOFF
+                while True:
+                    if self._try_acquire():
+                        self.stats.record(monotonic() - start, contended)
+                        return self
+                    contended = True
+                    if monotonic() >= deadline:
+                        break
+                    await asyncio.sleep(backoff)
+                    backoff = min(backoff * 2, self.MAX_BACKOFF)
+
+                sleep_time = uniform(30, 150)
+                logger_message = f"<LY><k>{self.file_name}</k></LY> | Failed to acquire lock for " \
+                                 f"{'accounts_config' if 'accounts_config' in self.file_name else 'session'}. " \
+                                 f"Retrying in {int(sleep_time)} seconds"
+                logger.info(logger_message)
+                await asyncio.sleep(sleep_time)
+        except BaseException:
+            self._release()
+            local_lock.release()
+            raise
 
     async def __aexit__(self, exc_type, exc_val, exc_tb):
-        await asyncio.to_thread(self.lock.release)
+        try:
+            self._release()
+        finally:
+            self.local_lock.release()
+
+    def __enter__(self):
+        """Blocking acquire, for places without a running event loop (e.g. interpreter shutdown)."""
+        backoff = self.MIN_BACKOFF
+        while not self._try_acquire():
+            sleep(backoff)
+            backoff = min(backoff * 2, self.MAX_BACKOFF)
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self._release()
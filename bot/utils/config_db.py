@@ -0,0 +1,106 @@
+import json
+import sqlite3
+import sys
+from os import path
+from threading import Lock
+
+from bot.utils import logger
+
+
+class SQLiteConfigBackend:
+    """Accounts config stored in SQLite (WAL mode), one row per session.
+
+    Rows are written one by one with upserts, so concurrent writers only contend on the rows they
+    change instead of rewriting the whole accounts config.
+    """
+
+    def __init__(self, db_path: str):
+        self.db_path = db_path
+        self._lock = Lock()
+        self._conn = sqlite3.connect(db_path, timeout=30, isolation_level=None, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute("CREATE TABLE IF NOT EXISTS accounts ("
+                           "session_name TEXT PRIMARY KEY, "
+                           "proxy TEXT, "
+                           "config TEXT NOT NULL)")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS accounts_proxy ON accounts (proxy)")
+        # Writes run in a worker thread (see AccountsConfigStore.flush) on their own connection, so waiting for
+        # the write lock of the database doesn't block reads made from the event loop
+        self._write_conn = sqlite3.connect(db_path, timeout=30, isolation_level=None, check_same_thread=False)
+        self._write_conn.execute("PRAGMA synchronous=NORMAL")
+
+    def is_empty(self) -> bool:
+        return self._conn.execute("SELECT 1 FROM accounts LIMIT 1").fetchone() is None
+
+    def load_all(self) -> dict:
+        rows = self._conn.execute("SELECT session_name, config FROM accounts").fetchall()
+        return {session_name: json.loads(config) for session_name, config in rows}
+
+    def sessions_with_proxy(self, proxy: str) -> list[str]:
+        rows = self._conn.execute("SELECT session_name FROM accounts WHERE proxy = ?", (proxy,)).fetchall()
+        return [row[0] for row in rows]
+
+    def write(self, configs: dict[str, dict], removed: set[str] = ()):
+        """Upserts the given sessions and deletes the removed ones in a single transaction.
+        Blocks while another process writes, call it from a worker thread in async code."""
+        with self._lock:
+            try:
+                self._write_conn.execute("BEGIN IMMEDIATE")
+                self._write_conn.executemany(
+                    "INSERT INTO accounts (session_name, proxy, config) VALUES (?, ?, ?) "
+                    "ON CONFLICT (session_name) DO UPDATE SET proxy = excluded.proxy, config = excluded.config",
+                    [(session_name, session_config.get('proxy'), json.dumps(session_config))
+                     for session_name, session_config in configs.items()])
+                self._write_conn.executemany("DELETE FROM accounts WHERE session_name = ?",
+                                             [(session_name,) for session_name in removed])
+                self._write_conn.execute("COMMIT")
+            except Exception:
+                self._write_conn.execute("ROLLBACK")
+                raise
+
+    def import_json(self, json_path: str) -> int:
+        """Upserts every session of a JSON accounts config. Returns the amount of imported sessions."""
+        with open(json_path, 'r') as f:
+            content = f.read()
+        configs = json.loads(content) if content else {}
+        self.write(configs)
+        return len(configs)
+
+    def export_json(self, json_path: str) -> int:
+        """Writes all sessions to a file in the JSON accounts config format. Returns the amount of sessions."""
+        configs = self.load_all()
+        with open(json_path, 'w') as f:
+            json.dump(configs, f, indent=2)
+        return len(configs)
+
+    def close(self):
+        self._conn.close()
+        self._write_conn.close()
+
+
+def get_db_path(config_path: str) -> str:
+    return f"{path.splitext(config_path)[0]}.db"
+
+
+def open_backend(config_path: str) -> SQLiteConfigBackend:
+    """Opens the database next to the JSON config. An empty database is filled from the JSON config."""
+    backend = SQLiteConfigBackend(get_db_path(config_path))
+    if backend.is_empty() and path.isfile(config_path):
+        imported = backend.import_json(config_path)
+        if imported:
+            logger.info(f"Imported {imported} sessions from `{config_path}` to `{backend.db_path}`")
+    return backend
+
+
+if __name__ == '__main__':
+    from bot.utils import CONFIG_PATH
+
+    if len(sys.argv) < 2 or sys.argv[1] not in ('import', 'export'):
+        sys.exit("Usage: python -m bot.utils.config_db (import|export) [json_path]")
+    json_file = sys.argv[2] if len(sys.argv) > 2 else CONFIG_PATH
+    db = SQLiteConfigBackend(get_db_path(CONFIG_PATH))
+    if sys.argv[1] == 'import':
+        logger.success(f"Imported {db.import_json(json_file)} sessions from `{json_file}` to `{db.db_path}`")
+    else:
+        logger.success(f"Exported {db.export_json(json_file)} sessions from `{db.db_path}` to `{json_file}`")
@@ -1,9 +1,12 @@
 import asyncio
+import atexit
 import json
+from bot.config import settings
 from bot.utils import logger, log_error, AsyncInterProcessLock
 from opentele.api import API
-from os import path, remove
+from os import path, remove, replace as replace_file, stat as os_stat
 from copy import deepcopy
+from typing import Callable
 
 
 def read_config_file(config_path: str) -> dict:
@@ -26,60 +29,268 @@ def read_config_file(config_path: str) -> dict:
     return config
 
 
+def build_proxy_index(config: dict) -> dict[str, set[str]]:
+    """Maps every proxy of the accounts config to the sessions bound to it."""
+    index = {}
+    for session_name, session_config in config.items():
+        if session_config.get('proxy'):
+            index.setdefault(session_config['proxy'], set()).add(session_name)
+    return index
+
+
+class AccountsConfigStore:
+    """Process-wide in-memory copy of an accounts config file.
+
+    The file is read once. Updated sessions are marked dirty and written back in batches:
+    the first change schedules a flush in FLUSH_DELAY seconds and every change made until then
+    is written by that same flush. Flushes merge dirty sessions into the current file contents
+    under the inter-process lock and replace the file atomically, so changes made by other processes
+    to other sessions are kept.
+
+    With CONFIG_BACKEND=sqlite the sessions are kept in a SQLite database next to the JSON file instead
+    and a flush upserts only the dirty rows.
+    """
+
+    FLUSH_DELAY = 1
+
+    def __init__(self, config_path: str):
+        self.config_path = config_path
+        self._config: dict | None = None
+        self._dirty: set[str] = set()
+        self._removed: set[str] = set()
+        self._writing: set[str] = set()
+        self._proxy_index: dict[str, set[str]] = {}
+        self._shared_proxy_index: dict[str, set[str]] = {}
+        self._shared_version = None
+        self._flush_handle: asyncio.TimerHandle | None = None
+        self._flush_task: asyncio.Task | None = None
+        self._listeners: list[Callable[[str, dict], None]] = []
+        self.backend = None
+        if settings.CONFIG_BACKEND.lower() == 'sqlite':
+            from bot.utils.config_db import open_backend
+            self.backend = open_backend(config_path)
+        self.lock = AsyncInterProcessLock(
+            path.join(path.dirname(config_path), 'lock_files', 'accounts_config.lock'))
+
+    @property
+    def config(self) -> dict:
+        """The in-memory config. Treat it as read-only, use `update` to change it."""
+        if self._config is None:
+            self._config = self.backend.load_all() if self.backend else read_config_file(self.config_path)
+            self._proxy_index = build_proxy_index(self._config)
+        return self._config
+
+    @property
+    def is_dirty(self) -> bool:
+        return bool(self._dirty or self._removed)
+
+    def get(self, session_name: str) -> dict:
+        return deepcopy(self.config.get(session_name, {}))
+
+    def sessions_with_proxy(self, proxy: str) -> set[str]:
+        """Sessions bound to the proxy in the shared config, including the ones saved by other processes since
+        the config was loaded. Changes of this process that are not written yet take precedence.
+        With the SQLite backend this is an indexed lookup, otherwise the file is read again when it changed."""
+        if self.backend:
+            shared = self.backend.sessions_with_proxy(proxy)
+        else:
+            shared = self._read_shared_proxy_index().get(proxy, ())
+        # Only the sessions of this proxy are looked at, through the proxy indexes
+        sessions = {session_name for session_name in shared
+                    if not self._is_pending(session_name) or
+                    self.config.get(session_name, {}).get('proxy') == proxy}
+        sessions.update(session_name for session_name in self._proxy_index.get(proxy, ())
+                        if self._is_pending(session_name))
+        return {session_name for session_name in sessions if session_name not in self._removed}
+
+    def _is_pending(self, session_name: str) -> bool:
+        return session_name in self._dirty or session_name in self._writing
+
+    def _read_shared_proxy_index(self) -> dict[str, set[str]]:
+        try:
+            stat = os_stat(self.config_path)
+            version = stat.st_mtime_ns, stat.st_size
+        except OSError:
+            return {}
+        if version != self._shared_version:
+            # The file is replaced atomically by writers, so it's read without the lock
+            self._shared_proxy_index = build_proxy_index(read_config_file(self.config_path))
+            self._shared_version = version
+        return self._shared_proxy_index
+
+    def _set(self, session_name: str, session_config: dict):
+        old_proxy = self.config.get(session_name, {}).get('proxy')
+        if old_proxy:
+            self._proxy_index.get(old_proxy, set()).discard(session_name)
+        if session_config.get('proxy'):
+            self._proxy_index.setdefault(session_config['proxy'], set()).add(session_name)
+        self.config[session_name] = deepcopy(session_config)
+
+    def load_session(self, session_name: str, session_config: dict):
+        """Puts a session config that is already saved by another process into the in-memory config."""
+        self._set(session_name, session_config)
+        self._notify(session_name, session_config)
+
+    def add_listener(self, listener: Callable[[str, dict], None]):
+        """Registers a callback called with (session_name, session_config) after every session change.
+        Removed sessions are reported with an empty config."""
+        self._listeners.append(listener)
+
+    def _notify(self, session_name: str, session_config: dict):
+        for listener in self._listeners:
+            listener(session_name, session_config)
+
+    def update(self, session_name: str, session_config: dict):
+        self._set(session_name, session_config)
+        self._dirty.add(session_name)
+        self._removed.discard(session_name)
+        self._notify(session_name, session_config)
+        self._schedule_flush()
+
+    def replace(self, content: dict):
+        removed = set(self.config) - set(content)
+        self._removed.update(removed)
+        self._config = deepcopy(content)
+        self._proxy_index = build_proxy_index(self._config)
+        self._dirty.update(content)
+        for session_name in removed:
+            self._notify(session_name, {})
+        for session_name, session_config in content.items():
+            self._notify(session_name, session_config)
+
+    def _schedule_flush(self):
+        if self._flush_handle:
+            return
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            return
+        self._flush_handle = loop.call_later(self.FLUSH_DELAY, self._start_flush)
+
+    def _start_flush(self):
+        self._flush_handle = None
+        if not self._flush_task or self._flush_task.done():
+            self._flush_task = asyncio.create_task(self.flush())
+        else:
+            self._schedule_flush()
+
+    async def flush(self):
+        """Writes dirty sessions to the file. Does nothing if there are no pending changes."""
+        if self._flush_handle:
+            self._flush_handle.cancel()
+            self._flush_handle = None
+        if not self.is_dirty:
+            return
+        dirty, removed = self._dirty, self._removed
+        self._dirty, self._removed = set(), set()
+        self._writing = dirty
+        try:
+            if self.backend:
+                configs = {session_name: self.config[session_name]
+                           for session_name in dirty if session_name in self.config}
+                # Waiting for other processes to finish their writes must not block the event loop
+                await asyncio.to_thread(self.backend.write, configs, removed)
+            else:
+                async with self.lock:
+                    self._write(dirty, removed)
+        except Exception as e:
+            self._dirty |= dirty
+            self._removed |= removed
+            logger.error(f"An error occurred while writing to {self.config_path}: {e}")
+        finally:
+            self._writing = set()
+
+    def _write(self, dirty: set[str], removed: set[str]):
+        if self.backend:
+            self.backend.write({session_name: self.config[session_name]
+                                for session_name in dirty if session_name in self.config}, removed)
+            return
+        content = read_config_file(self.config_path)
+        for session_name in removed:
+            content.pop(session_name, None)
+        for session_name in dirty:
+            if session_name in self.config:
+                content[session_name] = self.config[session_name]
+        tmp_path = f"{self.config_path}.tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump(content, f, indent=2)
+        replace_file(tmp_path, self.config_path)
+
+    def flush_on_exit(self):
+        if not self.is_dirty:
+            return
+        dirty, removed = self._dirty, self._removed
+        self._dirty, self._removed = set(), set()
+        try:
+            if self.backend:
+                self._write(dirty, removed)
+            else:
+                with self.lock:
+                    self._write(dirty, removed)
+        except Exception as e:
+            logger.error(f"An error occurred while writing to {self.config_path}: {e}")
+
+
+_config_stores: dict[str, AccountsConfigStore] = {}
+
+
+def get_config_store(config_path: str) -> AccountsConfigStore:
+    """Returns the process-wide config store for the config file, creating it on first use."""
+    store = _config_stores.get(config_path)
+    if not store:
+        store = _config_stores[config_path] = AccountsConfigStore(config_path)
+        atexit.register(store.flush_on_exit)
+    return store
+
+
+async def flush_config_stores():
+    """Writes pending changes of every config store."""
+    for store in list(_config_stores.values()):
+        await store.flush()
+
+
 async def write_config_file(content: dict, config_path: str):
-    """Writes the contents of a config file. If the file does not exist, creates it.
+    """Replaces the contents of a config file. If the file does not exist, creates it.
 
      Args:
        config_path: Path to the .json file. If empty, 'bot/config/accounts_config.json' is used
        content (dict): Content we want to write
-
-     Returns:
-       The contents of the file, or an empty dict if the file was empty or created.
      """
-    lock = AsyncInterProcessLock(path.join(path.dirname(config_path), 'lock_files', 'accounts_config.lock'))
-    try:
-        async with lock:
-            with open(config_path, 'w+') as f:
-                json.dump(content, f, indent=2)
-            await asyncio.sleep(0.1)
-    except IOError as e:
-        logger.error(f"An error occurred while writing to {config_path}: {e}")
+    store = get_config_store(config_path)
+    store.replace(content)
+    await store.flush()
 
 
 def get_session_config(session_name: str, config_path: str) -> dict:
-    """Gets the session config for specified session name.
+    """Gets the session config for specified session name from the in-memory config.
 
      Args:
        session_name (dict): The name of the session
        config_path: Path to the .json file. If empty, 'bot/config/accounts_config.json' is used
 
      Returns:
-       The config object for specified session_name, or an empty dict if the file was empty or created.
+       The config object for specified session_name, or an empty dict if there's no config for the session.
      """
-    return read_config_file(config_path).get(session_name, {})
+    return get_config_store(config_path).get(session_name)
 
 
 async def update_session_config_in_file(session_name: str, updated_session_config: dict, config_path: str):
-    """Updates the content of a session in config file. If the file does not exist, creates it.
+    """Updates the session in the in-memory config. The change is written to the file shortly after,
+    together with other changes made in the meantime.
 
      Args:
        session_name (dict): The name of the session
        updated_session_config (dict): The config to override
        config_path: Path to the .json file. If empty, 'bot/config/accounts_config.json' is used
-
-     Returns:
-       The contents of the file, or an empty dict if the file was empty or created.
      """
     try:
-        config = read_config_file(config_path)
-        config[session_name] = updated_session_config
-        await write_config_file(config, config_path)
+        get_config_store(config_path).update(session_name, updated_session_config)
     except Exception as e:
         log_error(e)
 
 
 async def restructure_config(config_path: str):
-    config = read_config_file(config_path)
+    config = get_config_store(config_path).config
     if config:
         cfg_copy = deepcopy(config)
         for key, value in cfg_copy.items():
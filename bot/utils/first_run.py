@@ -1,13 +1,88 @@
+import os
+
 import aiofiles
 
+from bot.utils.async_lock import AsyncInterProcessLock
+
+FIRST_RUN_FILE = 'first_run.txt'
+
+# Sessions that already ran, in step with the append-only file. `_offset` is how many bytes of the file are read.
+# The file is read and written in binary mode, so the offset counts raw bytes whatever the line endings are.
+# compact() replaces the file with a new one, `_inode` tells that it has to be read from the start again.
+_sessions: set[str] = set()
+_offset = 0
+_inode = None
+_lock: AsyncInterProcessLock | None = None
+
+
+def _get_lock() -> AsyncInterProcessLock:
+    global _lock
+    if not _lock:
+        from bot.utils import CONFIG_PATH
+        _lock = AsyncInterProcessLock(os.path.join(os.path.dirname(CONFIG_PATH), 'lock_files', 'first_run.lock'))
+    return _lock
+
+
+def _parse(content: bytes) -> set[str]:
+    return {line.strip() for line in content.decode().split('\n') if line.strip()}
+
+
+async def _sync():
+    """Reads the lines appended to the file since the last call, by this or other processes."""
+    global _offset, _inode
+    try:
+        stat = os.stat(FIRST_RUN_FILE)
+        size, inode = stat.st_size, stat.st_ino
+    except FileNotFoundError:
+        size, inode = 0, None
+    if inode != _inode or size < _offset:
+        _sessions.clear()
+        _offset = 0
+        _inode = inode
+    if size == _offset:
+        return
+    async with aiofiles.open(FIRST_RUN_FILE, mode='rb') as file:
+        await file.seek(_offset)
+        content = await file.read()
+    complete, _, _ = content.rpartition(b'\n')
+    if complete:
+        _sessions.update(_parse(complete))
+        _offset += len(complete) + 1
+
 
 async def check_is_first_run(session_name: str):
-    async with aiofiles.open('first_run.txt', mode='a+') as file:
-        await file.seek(0)
-        lines = await file.readlines()
-    return session_name.lower() not in [line.strip() for line in lines]
+    await _sync()
+    return session_name.lower() not in _sessions
 
 
 async def append_recurring_session(session_name: str):
-    async with aiofiles.open('first_run.txt', mode='a+') as file:
-        await file.writelines(session_name.lower() + '\n')
+    session_name = session_name.lower()
+    await _sync()
+    if session_name in _sessions:
+        return
+    _sessions.add(session_name)
+    # Under the lock of compact(), so a line appended while the file is rewritten isn't lost
+    async with _get_lock():
+        async with aiofiles.open(FIRST_RUN_FILE, mode='ab') as file:
+            await file.write(f"{session_name}\n".encode())
+
+
+async def compact():
+    """Rewrites the file without duplicate lines. Called once at startup."""
+    global _offset, _inode
+    async with _get_lock():
+        if not os.path.isfile(FIRST_RUN_FILE):
+            return
+        async with aiofiles.open(FIRST_RUN_FILE, mode='rb') as file:
+            original = await file.read()
+        sessions = _parse(original)
+        content = ''.join(f"{session_name}\n" for session_name in sorted(sessions)).encode()
+        if content != original:
+            tmp_path = f"{FIRST_RUN_FILE}.{os.getpid()}.tmp"
+            async with aiofiles.open(tmp_path, mode='wb') as file:
+                await file.write(content)
+            os.replace(tmp_path, FIRST_RUN_FILE)
+        _sessions.clear()
+        _sessions.update(sessions)
+        _offset = len(content)
+        _inode = os.stat(FIRST_RUN_FILE).st_ino
@@ -0,0 +1,39 @@
+import aiohttp
+from aiohttp_proxy import ProxyConnector
+
+from bot.config import settings
+
+DIRECT = 'direct'
+DNS_CACHE_TTL = 300
+KEEPALIVE_TIMEOUT = 60
+
+
+class ConnectorRegistry:
+    """Shared aiohttp connectors, one per proxy url and one for proxy-less sessions.
+
+    Sessions going through the same proxy (or without one) reuse its pooled keep-alive sockets and DNS cache
+    instead of doing their own DNS lookup, TCP connect and TLS handshake. Each session still has its own
+    ClientSession with its own cookies and headers: pass `connector_owner=False` so closing it keeps the
+    shared connector open.
+    """
+
+    def __init__(self, limit: int = None):
+        self.limit = settings.HTTP_CONNECTIONS_PER_PROXY if limit is None else limit
+        self._connectors: dict[str, aiohttp.TCPConnector] = {}
+
+    def get(self, proxy: str | None) -> aiohttp.TCPConnector:
+        key = proxy or DIRECT
+        connector = self._connectors.get(key)
+        if connector is None or connector.closed:
+            params = {'limit': self.limit, 'ttl_dns_cache': DNS_CACHE_TTL, 'keepalive_timeout': KEEPALIVE_TIMEOUT}
+            connector = ProxyConnector.from_url(proxy, **params) if proxy else aiohttp.TCPConnector(**params)
+            self._connectors[key] = connector
+        return connector
+
+    async def close_all(self):
+        for connector in self._connectors.values():
+            await connector.close()
+        self._connectors.clear()
+
+
+connectors = ConnectorRegistry()
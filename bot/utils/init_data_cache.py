@@ -0,0 +1,56 @@
+import os
+import stat
+from time import time
+
+from bot.utils.json_cache import PersistentJsonCache
+
+
+class InitDataCache(PersistentJsonCache):
+    """Parsed init data of the sessions, persisted next to accounts_config.json and keyed by session name.
+
+    Each entry keeps tg_web_data, user_data, ref_code, the creation time and the live time, so a restarted bot
+    can reuse the init data while it's still valid instead of asking Telegram again. The file is readable
+    by its owner only.
+    """
+
+    VERSION_KEY = 'created'
+    FILE_MODE = 0o600
+    DESCRIPTION = 'init data cache'
+
+    def __init__(self, bot_username: str, file_path: str = None):
+        super().__init__(file_path)
+        self.bot_username = bot_username
+
+    def get_default_path(self) -> str:
+        from bot.utils import CONFIG_PATH
+        return os.path.join(os.path.dirname(CONFIG_PATH), f"init_data_{self.bot_username.lower()}.json")
+
+    def _read_file(self) -> dict[str, dict]:
+        try:
+            if os.stat(self.file_path).st_mode & (stat.S_IRWXG | stat.S_IRWXO):
+                os.chmod(self.file_path, 0o600)
+        except OSError:
+            pass
+        return super()._read_file()
+
+    def get(self, session_name: str) -> dict | None:
+        """The cached init data of the session, or None if there's none or it has expired."""
+        entry = self.entries.get(session_name)
+        if not entry or not entry.get('tg_web_data') or time() >= entry.get('created', 0) + entry.get('live_time', 0):
+            return None
+        return entry
+
+    def set(self, session_name: str, tg_web_data: str, user_data: dict, ref_code: str, created: float,
+            live_time: float):
+        self.entries[session_name] = {'tg_web_data': tg_web_data, 'user_data': user_data, 'ref_code': ref_code,
+                                      'created': created, 'live_time': live_time}
+        self._schedule_save()
+
+    def remove(self, session_name: str):
+        if self.entries.pop(session_name, None):
+            self.entries[session_name] = {'created': time()}
+            self._schedule_save()
+
+    def prune(self, entries: dict[str, dict]) -> dict[str, dict]:
+        return {session_name: entry for session_name, entry in entries.items()
+                if time() < entry.get('created', 0) + entry.get('live_time', 0)}
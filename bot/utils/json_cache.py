@@ -0,0 +1,124 @@
+import asyncio
+import atexit
+import json
+import os
+
+from bot.utils import logger
+from bot.utils.async_lock import AsyncInterProcessLock
+
+
+class PersistentJsonCache:
+    """Entries keyed by name, kept in memory and persisted to a JSON file shared by all processes.
+
+    Changes are written SAVE_DELAY seconds after the first one, together with the ones made meanwhile.
+    A save reads the file, merges the entries of this process into it (the entry with the higher VERSION_KEY
+    wins) and replaces the file, all under an inter-process lock in lock_files, so entries saved by other
+    processes at the same time are kept.
+    """
+
+    SAVE_DELAY = 1
+    VERSION_KEY = 'updated'
+    FILE_MODE = 0o644
+    JSON_INDENT = None
+    DESCRIPTION = 'cache'
+
+    def __init__(self, file_path: str = None):
+        self._file_path = file_path
+        self._entries: dict[str, dict] | None = None
+        self._dirty = False
+        self._save_handle: asyncio.TimerHandle | None = None
+        self._save_task: asyncio.Task | None = None
+        self._lock: AsyncInterProcessLock | None = None
+        atexit.register(self.save)
+
+    def get_default_path(self) -> str:
+        raise NotImplementedError
+
+    @property
+    def file_path(self) -> str:
+        if not self._file_path:
+            self._file_path = self.get_default_path()
+        return self._file_path
+
+    @property
+    def lock(self) -> AsyncInterProcessLock:
+        if not self._lock:
+            from bot.utils import CONFIG_PATH
+            file_name, _ = os.path.splitext(os.path.basename(self.file_path))
+            self._lock = AsyncInterProcessLock(
+                os.path.join(os.path.dirname(CONFIG_PATH), 'lock_files', f"{file_name}.lock"))
+        return self._lock
+
+    @property
+    def entries(self) -> dict[str, dict]:
+        if self._entries is None:
+            self._entries = self._read_file()
+        return self._entries
+
+    def _read_file(self) -> dict[str, dict]:
+        try:
+            with open(self.file_path, 'r') as f:
+                content = f.read()
+                return json.loads(content) if content else {}
+        except FileNotFoundError:
+            return {}
+        except (ValueError, OSError) as e:
+            logger.warning(f"Failed to read {self.DESCRIPTION} `{self.file_path}`: {e}")
+            return {}
+
+    def prune(self, entries: dict[str, dict]) -> dict[str, dict]:
+        """Drops the entries that shouldn't be saved any more."""
+        return entries
+
+    def _schedule_save(self):
+        self._dirty = True
+        if self._save_handle:
+            return
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            self.save()
+            return
+        self._save_handle = loop.call_later(self.SAVE_DELAY, self._start_save)
+
+    def _start_save(self):
+        self._save_handle = None
+        if not self._save_task or self._save_task.done():
+            self._save_task = asyncio.create_task(self.save_async())
+        else:
+            self._schedule_save()
+
+    async def save_async(self):
+        """Writes pending changes to disk without blocking the event loop while other processes save."""
+        if not self._dirty:
+            return
+        async with self.lock:
+            self._write()
+
+    def save(self):
+        """Writes pending changes to disk, blocking until the lock is free. For places without a running loop."""
+        if self._save_handle:
+            self._save_handle.cancel()
+            self._save_handle = None
+        if not self._dirty or self._entries is None:
+            return
+        with self.lock:
+            self._write()
+
+    def _write(self):
+        if not self._dirty or self._entries is None:
+            return
+        self._dirty = False
+        merged = self._read_file()
+        for name, entry in self._entries.items():
+            if entry.get(self.VERSION_KEY, 0) >= merged.get(name, {}).get(self.VERSION_KEY, 0):
+                merged[name] = entry
+        merged = self.prune(merged)
+        self._entries = merged
+        tmp_path = f"{self.file_path}.{os.getpid()}.tmp"
+        try:
+            with open(os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, self.FILE_MODE), 'w') as f:
+                json.dump(merged, f, indent=self.JSON_INDENT)
+            os.replace(tmp_path, self.file_path)
+        except OSError as e:
+            logger.warning(f"Failed to save {self.DESCRIPTION} `{self.file_path}`: {e}")
@@ -0,0 +1,145 @@
+import asyncio
+import os
+from time import time
+
+import aiohttp
+from aiohttp_proxy.errors import ProxyError, SocksError
+
+from bot.config import settings
+from bot.utils.json_cache import PersistentJsonCache
+
+DIRECT = 'direct'
+TIME_ZONE_URL = 'http://ip-api.com/json/'
+TIME_ZONE_TTL = 24 * 3600
+
+
+class ProxyHealthCache(PersistentJsonCache):
+    """Health table of proxies, persisted next to proxies.txt and keyed by proxy url.
+
+    Each entry keeps the time of the last successful check, its latency, the exit IP
+    and the current failure streak. Entries older than PROXY_HEALTH_TTL are considered stale.
+
+    The entries also keep the time zone of the exit IP (proxy-less sessions under the `direct` key), shared by
+    all sessions of the proxy for TIME_ZONE_TTL seconds.
+
+    Besides the active checks, the entries are fed by the results of real API requests (see `trace_config`),
+    which drive a circuit breaker per proxy: `closed` while the proxy works, `open` for BREAKER_COOLDOWN
+    seconds after BREAKER_THRESHOLD failures in a row, then `half-open` until a request or check succeeds.
+    """
+
+    FILE_NAME = 'proxies_health.json'
+    JSON_INDENT = 2
+    DESCRIPTION = 'proxy health cache'
+    BREAKER_THRESHOLD = 3
+    BREAKER_COOLDOWN = 300
+    PASSIVE_SAVE_INTERVAL = 60
+
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half-open'
+
+    def __init__(self, file_path: str = None, ttl: int = None):
+        super().__init__(file_path)
+        self.ttl = settings.PROXY_HEALTH_TTL if ttl is None else ttl
+        self._time_zone_lookups: dict[str, asyncio.Future] = {}
+
+    def get_default_path(self) -> str:
+        from bot.utils import PROXIES_PATH
+        return os.path.join(os.path.dirname(PROXIES_PATH), self.FILE_NAME)
+
+    def get(self, proxy: str) -> dict:
+        return self.entries.get(proxy, {})
+
+    def is_fresh(self, proxy: str) -> bool:
+        """True if the proxy was working less than `ttl` seconds ago and hasn't failed since."""
+        entry = self.get(proxy)
+        return bool(self.ttl and entry.get('last_success') and not entry.get('failures')
+                    and time() - entry['last_success'] < self.ttl)
+
+    def is_failing(self, proxy: str) -> bool:
+        """True if the last check of the proxy failed less than `ttl` seconds ago."""
+        entry = self.get(proxy)
+        return bool(self.ttl and entry.get('failures') and time() - entry.get('last_failure', 0) < self.ttl)
+
+    def state(self, proxy: str) -> str:
+        """Circuit breaker state of the proxy."""
+        entry = self.get(proxy)
+        if entry.get('failures', 0) < self.BREAKER_THRESHOLD:
+            return self.CLOSED
+        if time() - entry.get('last_failure', 0) < self.BREAKER_COOLDOWN:
+            return self.OPEN
+        return self.HALF_OPEN
+
+    def rank(self, proxy: str) -> int:
+        """Sort key that puts fresh proxies first and recently failed proxies last."""
+        return 0 if self.is_fresh(proxy) else 2 if self.is_failing(proxy) else 1
+
+    def record_success(self, proxy: str, latency: float = None, ip: str = None):
+        entry = self.entries.setdefault(proxy, {})
+        entry.update(last_success=time(), failures=0, updated=time())
+        if latency is not None:
+            entry['latency'] = round(latency, 3)
+        if ip:
+            entry['ip'] = ip
+        self._schedule_save()
+
+    def record_failure(self, proxy: str):
+        entry = self.entries.setdefault(proxy, {})
+        entry.update(last_failure=time(), failures=entry.get('failures', 0) + 1, updated=time())
+        self._schedule_save()
+
+    def record_response(self, proxy: str):
+        """A real request got a response through the proxy. Saved at most every PASSIVE_SAVE_INTERVAL seconds
+        while nothing changes, since it happens on every request."""
+        entry = self.entries.setdefault(proxy, {})
+        changed = entry.get('failures') or time() - entry.get('updated', 0) >= self.PASSIVE_SAVE_INTERVAL
+        entry.update(last_success=time(), failures=0)
+        if changed:
+            entry['updated'] = time()
+            self._schedule_save()
+
+    async def get_time_zone(self, proxy: str | None, http_client: aiohttp.ClientSession) -> str:
+        """Time zone of the exit IP of the proxy. Looked up through `http_client` when it's not cached,
+        sessions asking for the same proxy meanwhile wait for that single lookup. Raises if the lookup fails."""
+        key = proxy or DIRECT
+        entry = self.get(key)
+        if entry.get('time_zone') and time() - entry.get('time_zone_updated', 0) < TIME_ZONE_TTL:
+            return entry['time_zone']
+        lookup = self._time_zone_lookups.get(key)
+        if not lookup:
+            lookup = self._time_zone_lookups[key] = asyncio.ensure_future(self._lookup_time_zone(key, http_client))
+            lookup.add_done_callback(lambda _: self._time_zone_lookups.pop(key, None))
+        return await asyncio.shield(lookup)
+
+    async def _lookup_time_zone(self, key: str, http_client: aiohttp.ClientSession) -> str:
+        response = await http_client.get(TIME_ZONE_URL, timeout=aiohttp.ClientTimeout(15))
+        response.raise_for_status()
+        result = await response.json(content_type=None)
+        entry = self.entries.setdefault(key, {})
+        entry.update(time_zone=result['timezone'], time_zone_updated=time(), updated=time())
+        if result.get('query'):
+            entry['ip'] = result['query']
+        self._schedule_save()
+        return entry['time_zone']
+
+    def trace_config(self, proxy: str) -> aiohttp.TraceConfig:
+        """Trace config for the http client of a session, recording the results of its requests for `proxy`."""
+
+        async def on_request_end(session, context, params: aiohttp.TraceRequestEndParams):
+            if params.response.status == 407:
+                self.record_failure(proxy)
+            else:
+                self.record_response(proxy)
+
+        async def on_request_exception(session, context, params: aiohttp.TraceRequestExceptionParams):
+            if isinstance(params.exception, (aiohttp.ClientConnectionError, asyncio.TimeoutError, OSError,
+                                             ProxyError, SocksError)):
+                self.record_failure(proxy)
+
+        trace_config = aiohttp.TraceConfig()
+        trace_config.on_request_end.append(on_request_end)
+        trace_config.on_request_exception.append(on_request_exception)
+        return trace_config
+
+
+proxy_health = ProxyHealthCache()
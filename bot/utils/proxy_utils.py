@@ -1,13 +1,16 @@
 import os
+import asyncio
 import aiohttp
 from aiohttp_proxy import ProxyConnector
-from collections import Counter
+from time import perf_counter
 from python_socks import ProxyType
 from shutil import copyfile
 from better_proxy import Proxy
 from bot.config import settings
 from bot.utils import logger
+from bot.utils.proxy_health import proxy_health
 from random import shuffle
+from typing import Callable
 
 PROXY_TYPES = {
     'socks5': ProxyType.SOCKS5,
@@ -16,6 +19,8 @@ PROXY_TYPES = {
     'https': ProxyType.HTTP
 }
 
+PROXY_CHECK_URL = 'https://ifconfig.me/ip'
+
 
 def get_proxy_type(proxy_type: str):
     return PROXY_TYPES.get(proxy_type.lower())
@@ -66,29 +71,237 @@ def get_proxies(proxy_path: str) -> list[str]:
         return []
 
 
+class ProxyAllocator:
+    """Keeps track of how many sessions use each proxy from the proxies file.
+
+    Built once from the accounts config and the proxies file. The file is parsed again only when
+    its mtime changes. Proxies used by less than SESSIONS_PER_PROXY sessions are kept in an insertion
+    ordered free list, so assigning and releasing a proxy takes constant time.
+
+    Other processes and hosts sharing the accounts config bind proxies too. If `shared_owners` is given, it
+    returns the sessions bound to a proxy in the shared config, and the usage of a proxy is checked against it
+    right before the proxy is handed out. The sessions of each proxy are indexed, so the check only touches
+    the sessions of that proxy.
+    """
+
+    def __init__(self, proxy_path: str, accounts_config: dict, limit: int = None,
+                 shared_owners: Callable[[str], set[str]] = None):
+        self.proxy_path = proxy_path
+        self.limit = limit or settings.SESSIONS_PER_PROXY
+        self.shared_owners = shared_owners
+        self._owners: dict[str, str] = {session_name: config.get('proxy')
+                                        for session_name, config in accounts_config.items() if config.get('proxy')}
+        self._sessions: dict[str, set[str]] = {}
+        for session_name, proxy in self._owners.items():
+            self._sessions.setdefault(proxy, set()).add(session_name)
+        self._proxies: set[str] = set()
+        self._free: dict[str, None] = {}
+        self._mtime = None
+        self._reload_if_changed()
+
+    def _reload_if_changed(self):
+        try:
+            mtime = os.stat(self.proxy_path).st_mtime
+        except OSError:
+            mtime = None
+        if self._proxies and mtime == self._mtime:
+            return
+        self._mtime = mtime
+        proxies = get_proxies(self.proxy_path)
+        shuffle(proxies)
+        self._proxies = set(proxies)
+        self._free = dict.fromkeys(proxy for proxy in proxies if self._usage(proxy) < self.limit)
+
+    def _usage(self, proxy: str) -> int:
+        return len(self._sessions.get(proxy, ()))
+
+    def is_available(self, proxy: str) -> bool:
+        """True if the proxy is on the free list. Doesn't check the proxies file, see `free_proxies`."""
+        return proxy in self._free
+
+    def _sync_proxy(self, proxy: str):
+        """Updates the usage of the proxy with its bindings in the shared config."""
+        if not self.shared_owners:
+            return
+        owners = self.shared_owners(proxy)
+        for session_name in [session_name for session_name in self._sessions.get(proxy, ())
+                             if session_name not in owners]:
+            self.release(session_name)
+        for session_name in owners:
+            self.assign(session_name, proxy)
+
+    def free_proxies(self) -> list[str]:
+        self._reload_if_changed()
+        return list(self._free)
+
+    def assign(self, session_name: str, proxy: str | None):
+        """Binds the proxy to the session, releasing the proxy the session used before."""
+        if self._owners.get(session_name) == proxy:
+            return
+        self.release(session_name)
+        if not proxy:
+            return
+        self._owners[session_name] = proxy
+        self._sessions.setdefault(proxy, set()).add(session_name)
+        if self._usage(proxy) >= self.limit:
+            self._free.pop(proxy, None)
+
+    def try_assign(self, session_name: str, proxy: str) -> bool:
+        """Binds the proxy to the session only if it's still free or already bound to the session."""
+        if self._owners.get(session_name) == proxy:
+            return True
+        self._sync_proxy(proxy)
+        if not self.is_available(proxy):
+            return False
+        self.assign(session_name, proxy)
+        return True
+
+    def acquire(self, session_name: str) -> str | None:
+        """Binds the first free proxy to the session."""
+        self._reload_if_changed()
+        checked = set()
+        while True:
+            # The free list changes while proxies are synced, so it's walked again from the start each time
+            proxy = next((proxy for proxy in self._free if proxy not in checked), None)
+            if not proxy or self.try_assign(session_name, proxy):
+                return proxy
+            checked.add(proxy)
+
+    def release(self, session_name: str):
+        proxy = self._owners.pop(session_name, None)
+        if not proxy:
+            return
+        self._sessions[proxy].discard(session_name)
+        if proxy in self._proxies and self._usage(proxy) < self.limit:
+            self._free[proxy] = None
+
+    def on_config_update(self, session_name: str, session_config: dict):
+        self.assign(session_name, session_config.get('proxy'))
+
+
+_proxy_allocators: dict[str, ProxyAllocator] = {}
+
+
+def get_proxy_allocator(accounts_config: dict = None, proxy_path: str = None) -> ProxyAllocator:
+    """Returns the allocator for the proxies file, building it on first use.
+    The allocator follows session updates of the accounts config store afterwards.
+    """
+    from bot.utils import config_utils, CONFIG_PATH, PROXIES_PATH
+    proxy_path = proxy_path or PROXIES_PATH
+    allocator = _proxy_allocators.get(proxy_path)
+    if not allocator:
+        store = config_utils.get_config_store(CONFIG_PATH)
+        allocator = ProxyAllocator(proxy_path, store.config if accounts_config is None else accounts_config,
+                                   shared_owners=store.sessions_with_proxy)
+        store.add_listener(allocator.on_config_update)
+        _proxy_allocators[proxy_path] = allocator
+    return allocator
+
+
 def get_unused_proxies(accounts_config, proxy_path: str):
-    proxies_count = Counter([v.get('proxy') for v in accounts_config.values() if v.get('proxy')])
-    all_proxies = get_proxies(proxy_path)
-    return [proxy for proxy in all_proxies if proxies_count.get(proxy, 0) < settings.SESSIONS_PER_PROXY]
+    return sorted(get_proxy_allocator(accounts_config, proxy_path).free_proxies(), key=proxy_health.rank)
+
 
+async def probe_proxy(proxy: str, url: str = PROXY_CHECK_URL, timeout: float = 15) -> tuple[float, str] | None:
+    """Sends a single request through the proxy.
 
-async def check_proxy(proxy):
-    url = 'https://ifconfig.me/ip'
+     Args:
+       proxy: Proxy url.
+       url: Url that responds with the exit IP.
+       timeout: Total timeout of the probe in seconds.
+
+     Returns:
+       Tuple of (latency in seconds, exit IP) or None if the proxy didn't respond.
+     """
     proxy_conn = ProxyConnector.from_url(proxy)
+    start = perf_counter()
     try:
-        async with aiohttp.ClientSession(connector=proxy_conn, timeout=aiohttp.ClientTimeout(15)) as session:
-            response = await session.get(url)
-            if response.status == 200:
-                logger.success(f"Successfully connected to proxy. IP: {await response.text()}")
-                if not proxy_conn.closed:
-                    proxy_conn.close()
-                return True
-    except Exception as e:
-        logger.warning(f"Proxy {proxy} didn't respond")
-        return False
+        async with aiohttp.ClientSession(connector=proxy_conn, timeout=aiohttp.ClientTimeout(timeout)) as session:
+            async with session.get(url) as response:
+                if response.status == 200:
+                    result = perf_counter() - start, (await response.text()).strip()
+                    proxy_health.record_success(proxy, *result)
+                    return result
+    except Exception:
+        pass
+    proxy_health.record_failure(proxy)
+    return None
 
 
-async def get_proxy_chain(path) -> (str | None, str | None):
+async def check_proxy(proxy, url: str = PROXY_CHECK_URL):
+    if proxy_health.is_fresh(proxy):
+        logger.success(f"Proxy is healthy according to cache. IP: {proxy_health.get(proxy).get('ip')}")
+        return True
+    result = await probe_proxy(proxy, url)
+    if result:
+        latency, ip = result
+        logger.success(f"Successfully connected to proxy. IP: {ip} | Latency: {latency:.2f}s")
+        return True
+    logger.warning(f"Proxy {proxy} didn't respond")
+    return False
+
+
+async def find_working_proxy(proxies: list[str], url: str = PROXY_CHECK_URL,
+                             concurrency: int = None, timeout: float = 15) -> str | None:
+    """Probes proxies concurrently and returns the first one that responds.
+    Probes that are still running when a working proxy is found get cancelled.
+
+     Args:
+       proxies: Proxy urls to probe. Probed in the given order, at most `concurrency` at a time.
+       url: Url that responds with the exit IP.
+       concurrency: Max amount of simultaneous probes. Defaults to PROXY_CHECK_CONCURRENCY.
+       timeout: Timeout of a single probe in seconds.
+
+     Returns:
+       The first working proxy or None if none of them responded.
+       A proxy that is fresh in the health cache is returned without probing.
+     """
+    fresh_proxy = next((proxy for proxy in proxies if proxy_health.is_fresh(proxy)), None)
+    if fresh_proxy:
+        logger.success(f"Proxy is healthy according to cache. IP: {proxy_health.get(fresh_proxy).get('ip')}")
+        return fresh_proxy
+    proxies = sorted(proxies, key=proxy_health.rank)
+    semaphore = asyncio.Semaphore(concurrency or settings.PROXY_CHECK_CONCURRENCY)
+
+    async def probe(proxy_url: str):
+        async with semaphore:
+            return proxy_url, await probe_proxy(proxy_url, url, timeout)
+
+    tasks = [asyncio.create_task(probe(proxy)) for proxy in proxies]
+    try:
+        for next_done in asyncio.as_completed(tasks):
+            proxy, result = await next_done
+            if result:
+                latency, ip = result
+                logger.success(f"Successfully connected to proxy. IP: {ip} | Latency: {latency:.2f}s")
+                return proxy
+            logger.warning(f"Proxy {proxy} didn't respond")
+    finally:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    return None
+
+
+async def check_proxies(proxies: list[str], url: str = PROXY_CHECK_URL,
+                        concurrency: int = None, timeout: float = 15) -> dict[str, float | None]:
+    """Probes all proxies with bounded concurrency.
+
+     Returns:
+       Mapping of proxy url to its latency in seconds, or None for proxies that didn't respond.
+     """
+    semaphore = asyncio.Semaphore(concurrency or settings.PROXY_CHECK_CONCURRENCY)
+
+    async def probe(proxy_url: str):
+        async with semaphore:
+            result = await probe_proxy(proxy_url, url, timeout)
+            return proxy_url, result[0] if result else None
+
+    return dict(await asyncio.gather(*[probe(proxy) for proxy in proxies]))
+
+
+def read_proxy_chain(path) -> (str | None, str | None):
     try:
         with open(path, 'r') as file:
             proxy = file.read().strip()
@@ -98,15 +311,37 @@ async def get_proxy_chain(path) -> (str | None, str | None):
         return None, None
 
 
-async def get_working_proxy(accounts_config: dict, current_proxy: str | None) -> str | None:
+async def get_proxy_chain(path) -> (str | None, str | None):
+    return read_proxy_chain(path)
+
+
+def set_proxy_chain(proxy):
+    """Routes every socket the process opens from now on through the proxy chain."""
+    import socket, socks
+    socks.set_default_proxy(proxy)
+    socket.socket = socks.socksocket
+
+
+async def get_working_proxy(accounts_config: dict, current_proxy: str | None, session_name: str = None) -> str | None:
+    """Returns the current proxy if it works or a working unused proxy.
+    If session_name is given, the proxy is bound to the session in the proxy allocator before returning,
+    so concurrent lookups for other sessions don't get the same proxy.
+    """
     if current_proxy and await check_proxy(current_proxy):
         return current_proxy
 
-    from bot.utils import PROXIES_PATH
-    unused_proxies = get_unused_proxies(accounts_config, PROXIES_PATH)
-    shuffle(unused_proxies)
-    for proxy in unused_proxies:
-        if await check_proxy(proxy):
-            return proxy
+    allocator = get_proxy_allocator(accounts_config)
+    candidates = [proxy for proxy in allocator.free_proxies() if proxy != current_proxy]
+    candidates.sort(key=lambda proxy: proxy_health.is_failing(proxy))
+    batch_size = settings.PROXY_CHECK_CONCURRENCY * 2
+    for i in range(0, len(candidates), batch_size):
+        batch = [proxy for proxy in candidates[i:i + batch_size] if allocator.is_available(proxy)]
+        while batch:
+            proxy = await find_working_proxy(batch)
+            if not proxy:
+                break
+            if not session_name or allocator.try_assign(session_name, proxy):
+                return proxy
+            batch = [candidate for candidate in batch if candidate != proxy and allocator.is_available(candidate)]
 
     return None
@@ -0,0 +1,198 @@
+import asyncio
+import json
+import os
+import socket
+from bisect import bisect
+from contextlib import suppress
+from hashlib import md5
+from time import time
+from typing import Awaitable, Callable
+
+from bot.utils import logger, AsyncInterProcessLock
+
+LEASE_TTL = 120
+RING_REPLICAS = 100
+
+
+def _hash(key: str) -> int:
+    return int(md5(key.encode()).hexdigest()[:16], 16)
+
+
+class HashRing:
+    """Consistent hash ring over shard numbers. Changing the amount of shards moves only ~1/n of the sessions."""
+
+    def __init__(self, shards_count: int, replicas: int = RING_REPLICAS):
+        points = sorted((_hash(f"shard-{shard}#{replica}"), shard)
+                        for shard in range(1, shards_count + 1) for replica in range(replicas))
+        self._keys = [key for key, _ in points]
+        self._shards = [shard for _, shard in points]
+
+    def get_shard(self, session_name: str) -> int:
+        index = bisect(self._keys, _hash(session_name.lower())) % len(self._keys)
+        return self._shards[index]
+
+
+class Shard:
+    """Slice of the sessions owned by this host: shard `index` out of `count`, both starting from 1."""
+
+    def __init__(self, index: int, count: int):
+        if not 1 <= index <= count:
+            raise ValueError(f"Invalid shard {index}/{count}: expected 1 <= i <= n")
+        self.index = index
+        self.count = count
+        self.ring = HashRing(count)
+        self.indexes = {index}
+
+    @classmethod
+    def from_str(cls, value: str) -> 'Shard':
+        """Parses `i/n`."""
+        try:
+            index, count = (int(part) for part in value.split('/'))
+        except ValueError:
+            raise ValueError(f"Invalid shard '{value}': expected i/n, e.g. 1/3")
+        return cls(index, count)
+
+    def owns(self, session_name: str, index: int = None) -> bool:
+        """True if the session belongs to shard `index` (default: any shard held by this host)."""
+        shard = self.ring.get_shard(os.path.basename(session_name))
+        return shard == index if index else shard in self.indexes
+
+    def __str__(self):
+        return f"{self.index}/{self.count}"
+
+
+class ShardLeases:
+    """Lease files of the shards in the shared lock_files folder.
+
+    The host keeps its leases alive by renewing them every LEASE_TTL / 3 seconds. When a lease of another
+    shard expires (its host stopped or crashed), this host takes it over together with its sessions.
+    Shards whose lease file doesn't exist yet were never started and are not taken over.
+
+    A host that finds its home shard leased by another host writes a claim file next to the lease. The host
+    holding the shard then stops its sessions and expires the lease instead of renewing it, so the home
+    host gets it back on its next attempt. A claim expires like a lease if its host stops waiting.
+    """
+
+    def __init__(self, shard: Shard, lease_dir: str, ttl: int = LEASE_TTL):
+        self.shard = shard
+        self.lease_dir = lease_dir
+        self.ttl = ttl
+        self.owner = f"{socket.gethostname()}:{os.getpid()}"
+        self.lock = AsyncInterProcessLock(os.path.join(lease_dir, f"shards_{shard.count}.lock"))
+
+    def _path(self, index: int, kind: str = 'lease') -> str:
+        return os.path.join(self.lease_dir, f"shard_{index}_of_{self.shard.count}.{kind}")
+
+    def _read(self, index: int, kind: str = 'lease') -> dict | None:
+        try:
+            with open(self._path(index, kind), 'r') as f:
+                return json.loads(f.read() or 'null')
+        except (OSError, ValueError):
+            return None
+
+    def _write(self, index: int, expires: float, kind: str = 'lease'):
+        os.makedirs(self.lease_dir, exist_ok=True)
+        tmp_path = f"{self._path(index, kind)}.{os.getpid()}.tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump({'owner': self.owner, 'expires': expires}, f)
+        os.replace(tmp_path, self._path(index, kind))
+
+    def _is_claimed(self, index: int) -> bool:
+        """True if another host waits for the shard as its home shard."""
+        claim = self._read(index, 'claim')
+        return bool(claim) and claim.get('owner') != self.owner and claim.get('expires', 0) > time()
+
+    async def try_claim(self, index: int, only_expired: bool = False) -> bool:
+        """Takes the lease if it's free, expired or already ours."""
+        async with self.lock:
+            lease = self._read(index)
+            if lease is None and only_expired:
+                return False
+            if lease and lease.get('owner') != self.owner and lease.get('expires', 0) > time():
+                return False
+            self._write(index, time() + self.ttl)
+        self.shard.indexes.add(index)
+        return True
+
+    async def _claim_home(self) -> bool:
+        """Tries to take the home shard, asking its current holder to hand it back if it's leased."""
+        index = self.shard.index
+        if await self.try_claim(index):
+            with suppress(OSError):
+                if (self._read(index, 'claim') or {}).get('owner') == self.owner:
+                    os.remove(self._path(index, 'claim'))
+            return True
+        self._write(index, time() + self.ttl, 'claim')
+        return False
+
+    async def acquire(self):
+        """Waits until the lease of the home shard is ours."""
+        while not await self._claim_home():
+            lease = self._read(self.shard.index) or {}
+            logger.warning(f"Shard {self.shard} is leased by {lease.get('owner')}. Asked it to hand the shard "
+                           f"back, waiting {self.ttl // 3}s")
+            await asyncio.sleep(self.ttl // 3)
+        logger.info(f"Acquired lease of shard {self.shard}")
+
+    async def _hand_back(self, index: int):
+        async with self.lock:
+            lease = self._read(index)
+            if lease and lease.get('owner') == self.owner:
+                self._write(index, 0)
+        self.shard.indexes.discard(index)
+
+    async def keep_alive(self, on_takeover: Callable[[int], Awaitable[None]],
+                         on_lost: Callable[[int], Awaitable[None]]):
+        """Renews our leases and takes over expired shards, starting on_takeover with the shard number
+        in the background. Shards claimed back by their home host and leases lost to another host are
+        dropped, after on_lost stopped their sessions. A lost home shard is claimed back."""
+        takeovers = set()
+
+        def start_takeover(shard_index: int):
+            takeover = asyncio.create_task(on_takeover(shard_index))
+            takeovers.add(takeover)
+            takeover.add_done_callback(takeovers.discard)
+
+        # An I/O error on the shared folder or a failing callback is logged and retried on the next tick,
+        # one shard at a time, instead of ending the task and with it the host
+        while True:
+            await asyncio.sleep(self.ttl // 3)
+            for index in sorted(self.shard.indexes):
+                try:
+                    if index != self.shard.index and self._is_claimed(index):
+                        logger.info(f"Handing shard {index}/{self.shard.count} back to its home host")
+                        await self._hand_back(index)
+                        await on_lost(index)
+                    elif not await self.try_claim(index):
+                        lease = self._read(index) or {}
+                        self.shard.indexes.discard(index)
+                        logger.error(f"Lost lease of shard {index}/{self.shard.count} to {lease.get('owner')}. "
+                                     f"Stopping its sessions")
+                        await on_lost(index)
+                except Exception as error:
+                    logger.error(f"Failed to renew lease of shard {index}/{self.shard.count}: {error}. "
+                                 f"Retrying in {self.ttl // 3}s")
+            try:
+                if self.shard.index not in self.shard.indexes and await self._claim_home():
+                    logger.info(f"Took back lease of shard {self.shard}")
+                    start_takeover(self.shard.index)
+            except Exception as error:
+                logger.error(f"Failed to take back lease of shard {self.shard}: {error}. "
+                             f"Retrying in {self.ttl // 3}s")
+            for index in range(1, self.shard.count + 1):
+                if index in self.shard.indexes or index == self.shard.index:
+                    continue
+                try:
+                    if not self._is_claimed(index) and await self.try_claim(index, only_expired=True):
+                        logger.warning(f"Shard {index}/{self.shard.count} lease expired. Taking it over")
+                        start_takeover(index)
+                except Exception as error:
+                    logger.error(f"Failed to check lease of shard {index}/{self.shard.count}: {error}. "
+                                 f"Retrying in {self.ttl // 3}s")
+
+    def release(self):
+        """Marks our leases as expired, so other hosts can take the shards over right away."""
+        for index in self.shard.indexes:
+            lease = self._read(index)
+            if lease and lease.get('owner') == self.owner:
+                self._write(index, 0)
@@ -0,0 +1,106 @@
+import asyncio
+from time import monotonic
+
+from bot.config import settings
+from bot.utils import logger
+from bot.utils.async_lock import LockStats
+
+STATS_INTERVAL = 600
+
+
+class TelegramAdmission:
+    """Process-wide admission control for Telegram connects and requests of all sessions.
+
+    At most `max_concurrent` sessions talk to Telegram at once (0 - no limit), and they're admitted at no more
+    than `rate` operations per second on average, with bursts of up to `burst` operations (token bucket).
+    Every FloodWait lowers the rate by a factor of 1 + seconds / FLOOD_WAIT_SCALE (a 30s wait halves it,
+    a few seconds barely change it), down to `rate / 16`; each admitted operation without one brings it back
+    up a bit. Used as `async with telegram_admission:`.
+    """
+
+    MIN_RATE_FACTOR = 1 / 16
+    RECOVERY_FACTOR = 1 / 50
+    FLOOD_WAIT_SCALE = 30
+
+    def __init__(self, rate: float = None, burst: int = None, max_concurrent: int = None):
+        self.base_rate = settings.TG_OPERATIONS_PER_SECOND if rate is None else rate
+        self.rate = self.base_rate
+        self.burst = max(burst or settings.TG_OPERATIONS_BURST, 1)
+        max_concurrent = settings.TG_MAX_CONCURRENT_OPERATIONS if max_concurrent is None else max_concurrent
+        self._semaphore = asyncio.Semaphore(max_concurrent) if max_concurrent > 0 else None
+        self._tokens = float(self.burst)
+        self._updated = monotonic()
+        self._bucket_lock: asyncio.Lock | None = None
+        self.waiting = 0
+        self.flood_waits = 0
+        self.stats = LockStats()
+
+    def _refill(self):
+        now = monotonic()
+        self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    async def take_token(self):
+        """Waits for a token of the bucket. Callers queue in arrival order."""
+        if self.base_rate <= 0:
+            return
+        if not self._bucket_lock:
+            self._bucket_lock = asyncio.Lock()
+        async with self._bucket_lock:
+            self._refill()
+            while self._tokens < 1:
+                await asyncio.sleep((1 - self._tokens) / self.rate)
+                self._refill()
+            self._tokens -= 1
+
+    async def acquire(self):
+        start = monotonic()
+        self.waiting += 1
+        try:
+            if self._semaphore:
+                await self._semaphore.acquire()
+            try:
+                await self.take_token()
+            except BaseException:
+                if self._semaphore:
+                    self._semaphore.release()
+                raise
+        finally:
+            self.waiting -= 1
+        wait = monotonic() - start
+        self.stats.record(wait, wait > 0.01)
+
+    def release(self):
+        if self._semaphore:
+            self._semaphore.release()
+        if self.rate < self.base_rate:
+            self.rate = min(self.base_rate, self.rate + self.base_rate * self.RECOVERY_FACTOR)
+
+    async def __aenter__(self):
+        await self.acquire()
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        self.release()
+
+    def report_flood_wait(self, seconds: float):
+        """Slows admission down after Telegram asked one of the sessions to wait."""
+        self.flood_waits += 1
+        if self.base_rate <= 0:
+            return
+        self._refill()
+        self.rate = max(self.base_rate * self.MIN_RATE_FACTOR,
+                        self.rate / (1 + max(seconds, 0) / self.FLOOD_WAIT_SCALE))
+        logger.debug(f"Telegram admission | FloodWait {int(seconds)}s, rate lowered to {self.rate:.2f}/s")
+
+    async def log_stats(self) -> float:
+        """Scheduler job: logs the admission queue and wait times."""
+        if self.stats.acquisitions:
+            logger.info(f"Telegram admission | queued <lc>{self.waiting}</lc>, admitted "
+                        f"<lc>{self.stats.acquisitions}</lc>, waited <lc>{self.stats.contended}</lc> times, "
+                        f"average wait <lc>{self.stats.average_wait:.1f}s</lc>, max <lc>{self.stats.max_wait:.1f}s</lc>, "
+                        f"FloodWaits <lc>{self.flood_waits}</lc>, rate <lc>{self.rate:.2f}/s</lc>")
+        return STATS_INTERVAL
+
+
+telegram_admission = TelegramAdmission()
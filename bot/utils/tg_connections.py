@@ -0,0 +1,99 @@
+import asyncio
+from collections import OrderedDict
+from time import monotonic
+
+from bot.config import settings
+from bot.utils import log_error
+
+
+class TelegramConnectionManager:
+    """Keeps Telegram clients connected between operations.
+
+    After an operation the client stays connected for TG_CONNECTION_IDLE_TIMEOUT seconds, so the next
+    operation of the session reuses the connection instead of doing a full connect again. At most
+    TG_MAX_CONNECTIONS clients are connected at once: when the limit is reached, the least recently used
+    idle client is disconnected, or the caller waits until a client is released. A connected client holds
+    the lock of its session, idle ones included, so other bots sharing the session files wait for the eviction.
+    Disabled when TG_CONNECTION_IDLE_TIMEOUT is 0.
+    """
+
+    def __init__(self, max_connections: int = None, idle_timeout: int = None):
+        self.max_connections = max_connections or settings.TG_MAX_CONNECTIONS
+        self.idle_timeout = settings.TG_CONNECTION_IDLE_TIMEOUT if idle_timeout is None else idle_timeout
+        self._idle: OrderedDict = OrderedDict()
+        self._in_use: set = set()
+        self._closing: dict = {}
+        self._released: asyncio.Event | None = None
+        self._reaper: asyncio.Task | None = None
+
+    @property
+    def enabled(self) -> bool:
+        return self.idle_timeout > 0
+
+    @property
+    def connected(self) -> int:
+        return len(self._idle) + len(self._in_use) + len(self._closing)
+
+    async def acquire(self, tg_client):
+        """Marks the client as in use and makes sure it's connected."""
+        if tg_client in self._closing:
+            await asyncio.shield(self._closing[tg_client])
+        if self._idle.pop(tg_client, None) is not None and tg_client.is_connected:
+            self._in_use.add(tg_client)
+            return
+
+        while self.connected >= self.max_connections:
+            if self._idle:
+                await self._evict(next(iter(self._idle)))
+            else:
+                if not self._released:
+                    self._released = asyncio.Event()
+                self._released.clear()
+                await self._released.wait()
+
+        self._in_use.add(tg_client)
+        try:
+            await tg_client.connect()
+        except BaseException:
+            self.release(tg_client)
+            raise
+
+    def release(self, tg_client):
+        """Marks the client as idle. It gets disconnected after idle_timeout seconds without use."""
+        self._in_use.discard(tg_client)
+        if tg_client.is_connected:
+            self._idle[tg_client] = monotonic()
+            if not self._reaper or self._reaper.done():
+                self._reaper = asyncio.create_task(self._reap_idle())
+        if self._released:
+            self._released.set()
+
+    async def _evict(self, tg_client):
+        self._idle.pop(tg_client, None)
+        task = self._closing[tg_client] = asyncio.create_task(tg_client.disconnect())
+        try:
+            await task
+        except Exception as error:
+            log_error(f"<ly>{tg_client.session_name}</ly> | Failed to disconnect: {type(error).__name__}")
+        finally:
+            self._closing.pop(tg_client, None)
+            if self._released:
+                self._released.set()
+
+    async def _reap_idle(self):
+        while self._idle:
+            await asyncio.sleep(min(self.idle_timeout, 5))
+            now = monotonic()
+            expired = [tg_client for tg_client, idle_since in self._idle.items()
+                       if now - idle_since >= self.idle_timeout]
+            for tg_client in expired:
+                await self._evict(tg_client)
+
+    async def close_all(self):
+        """Disconnects every client, the ones still in use included. Called at shutdown."""
+        for tg_client in list(self._idle) + list(self._in_use):
+            self._in_use.discard(tg_client)
+            await self._evict(tg_client)
+
+
+connection_manager = TelegramConnectionManager()
@@ -1,16 +1,24 @@
 import asyncio
 import os
+import sqlite3
 from better_proxy import Proxy
+from collections import deque
+from contextlib import asynccontextmanager, closing
 from datetime import datetime, timedelta
+from functools import partial
+from math import ceil
 from random import randint, uniform
 from sqlite3 import OperationalError
-from typing import Union
+from time import time
+from urllib.request import pathname2url
+from typing import Awaitable, Callable, Union
 
 from opentele.tl import TelegramClient
 from telethon.errors import *
 from telethon.functions import messages, channels, account
 from telethon.network import ConnectionTcpAbridged
-from telethon.types import InputBotAppShortName, InputPeerNotifySettings, InputNotifyPeer, InputUser
+from telethon.types import InputBotAppShortName, InputPeerNotifySettings, InputNotifyPeer, InputUser, \
+    InputPeerUser, InputPeerChannel
 
 import pyrogram.raw.functions.account as paccount
 import pyrogram.raw.functions.channels as pchannels
@@ -20,303 +28,491 @@ from pyrogram.errors import *
 from pyrogram.raw import types as ptypes
 
 from bot.config import settings
-from bot.exceptions import InvalidSession
+from bot.exceptions import InvalidSession, TelegramFloodWait
 from bot.utils.proxy_utils import to_pyrogram_proxy, to_telethon_proxy
-from bot.utils import logger, log_error, AsyncInterProcessLock, CONFIG_PATH, first_run
+from bot.utils import logger, log_error, config_utils, AsyncInterProcessLock, CONFIG_PATH, first_run
+from bot.utils.tg_admission import telegram_admission
+from bot.utils.tg_connections import connection_manager
+
+
+def detect_session_format(session_file: str) -> str:
+    """Tells a Telethon session file from a Pyrogram one by its schema: only the `sessions` table of Telethon
+    has a server_address column."""
+    with closing(sqlite3.connect(f"file:{pathname2url(os.path.abspath(session_file))}?mode=ro", uri=True)) as db:
+        columns = {row[1] for row in db.execute("PRAGMA table_info(sessions)")}
+    return 'telethon' if 'server_address' in columns else 'pyrogram'
+
+
+def _set_result(future: asyncio.Future, result):
+    if not future.done():
+        future.set_result(result)
+
+
+def _set_exception(future: asyncio.Future, error: BaseException):
+    if not future.done():
+        future.set_exception(error)
 
 
 class UniversalTelegramClient:
-    def __init__(self, **client_params):
-        self.session_name = None
-        self.client: Union[TelegramClient, PyrogramClient]
+    def __init__(self, session_format: str = None, **client_params):
+        self.session_name, _ = os.path.splitext(os.path.basename(client_params['session']))
+        self._client: Union[TelegramClient, PyrogramClient, None] = None
+        self._proxy: Proxy | None = None
         self.proxy = None
         self.is_fist_run = True
-        self.is_pyrogram: bool = False
+        self._is_pyrogram: bool | None = session_format == 'pyrogram' if session_format else None
         self._client_params = client_params
-        self._init_client()
 
         self.lock = AsyncInterProcessLock(
             os.path.join(os.path.dirname(CONFIG_PATH), 'lock_files', f"{self.session_name}.lock"))
 
         self._webview_data = None
+        self._lock_held = False
+        self._operations: deque = deque()
+        self._operations_task: asyncio.Task | None = None
+        self.flood_wait_until = 0
+
+    @property
+    def client(self) -> Union[TelegramClient, PyrogramClient]:
+        """The Telethon or Pyrogram client, created on first use and dropped after disconnecting, so a session
+        waiting for its next cycle keeps only its parameters and no open session file."""
+        if self._client is None:
+            self._init_client()
+        return self._client
+
+    @property
+    def is_pyrogram(self) -> bool:
+        if self._is_pyrogram is None:
+            self._init_client()
+        return self._is_pyrogram
 
     def _init_client(self):
-        try:
-            self.client = TelegramClient(connection=ConnectionTcpAbridged, **self._client_params)
-            self.is_pyrogram = False
-            self.session_name, _ = os.path.splitext(os.path.basename(self.client.session.filename))
-        except OperationalError:
-            session_name = self._client_params.pop('session')
-            self._client_params.pop('system_lang_code')
-            self._client_params['name'] = session_name
-            self.client = PyrogramClient(**self._client_params)
-            self.is_pyrogram = True
-            self.session_name, _ = os.path.splitext(os.path.basename(self.client.name))
+        # With no sleep threshold every FloodWait is raised instead of slept through inside the request, holding
+        # the session lock, the connection and the admission slot. The operations raise it as TelegramFloodWait.
+        if not self._is_pyrogram:
+            try:
+                self._client = TelegramClient(connection=ConnectionTcpAbridged, flood_sleep_threshold=0,
+                                              **self._client_params)
+                self._is_pyrogram = False
+            except OperationalError:
+                self._is_pyrogram = True
+        if self._is_pyrogram:
+            client_params = self._client_params.copy()
+            client_params['name'] = client_params.pop('session')
+            client_params.pop('system_lang_code', None)
+            self._client = PyrogramClient(sleep_threshold=0, **client_params)
+        if self._proxy:
+            self._apply_proxy()
 
     def set_proxy(self, proxy: Proxy):
-        if self.is_pyrogram is False:
-            self.proxy = to_telethon_proxy(proxy)
-            self.client.set_proxy(self.proxy)
+        self._proxy = proxy
+        if self._client is not None:
+            self._apply_proxy()
+
+    def _apply_proxy(self):
+        if self._is_pyrogram is False:
+            self.proxy = to_telethon_proxy(self._proxy)
+            self._client.set_proxy(self.proxy)
         else:
-            self.proxy = to_pyrogram_proxy(proxy)
-            self.client.proxy = self.proxy
+            self.proxy = to_pyrogram_proxy(self._proxy)
+            self._client.proxy = self.proxy
+
+    @property
+    def is_connected(self) -> bool:
+        if self._client is None:
+            return False
+        return self._client.is_connected if self._is_pyrogram else self._client.is_connected()
+
+    async def _hold_lock(self):
+        """Takes the session lock unless the client already holds it."""
+        if not self._lock_held:
+            await self.lock.__aenter__()
+            self._lock_held = True
+
+    async def _release_lock(self):
+        if self._lock_held:
+            self._lock_held = False
+            await self.lock.__aexit__(None, None, None)
+
+    async def connect(self):
+        """Connects the client. The session lock is held from here until `disconnect`, so other processes and
+        bots sharing lock_files don't use the session file while it's open, even while the client is idle."""
+        if not self.is_connected:
+            await self._hold_lock()
+            try:
+                await self.client.connect()
+            except BaseException:
+                await self.disconnect()
+                raise
+
+    async def disconnect(self):
+        """Disconnects and drops the client and releases the session lock. The next operation creates it again."""
+        try:
+            if self._client is None:
+                return
+            if self.is_connected:
+                await self._client.disconnect()
+            if not self._is_pyrogram:
+                self._client.session.close()
+            self._client = None
+        finally:
+            await self._release_lock()
+
+    @asynccontextmanager
+    async def _connection(self):
+        """Keeps the client connected for the duration of the block. With the connection manager enabled
+        the client stays connected afterwards, otherwise it's disconnected."""
+        if connection_manager.enabled:
+            await connection_manager.acquire(self)
+            try:
+                yield
+            finally:
+                connection_manager.release(self)
+        else:
+            try:
+                await self.connect()
+                yield
+            finally:
+                await self.disconnect()
+
+    async def _submit(self, operation: Callable[[], Awaitable], cooldown: float = 15):
+        """Queues a Telegram operation of this session and waits for its result.
+
+        Operations queued while the session is busy are run together: one lock acquisition and one connection
+        for the whole batch, with a short pause between them and a single `cooldown` (the longest requested
+        one) at the end instead of one per operation.
+
+        While the session is under a FloodWait, raises TelegramFloodWait right away instead of connecting."""
+        if self.flood_wait_until > time():
+            raise TelegramFloodWait(ceil(self.flood_wait_until - time()))
+        future = asyncio.get_running_loop().create_future()
+        self._operations.append((operation, future, cooldown))
+        if not self._operations_task or self._operations_task.done():
+            self._operations_task = asyncio.create_task(self._run_operations())
+        return await future
+
+    async def _run_operations(self):
+        await asyncio.sleep(0)
+        try:
+            while self._operations:
+                # The session lock is held while the client is connected. With TG_CONNECTION_IDLE_TIMEOUT the
+                # client stays connected after the batch and the lock is released when it's evicted
+                await self._hold_lock()
+                try:
+                    cooldown = 0
+                    async with telegram_admission, self._connection():
+                        while self._operations:
+                            operation, future, operation_cooldown = self._operations.popleft()
+                            if future.done():
+                                continue
+                            if self.flood_wait_until > time():
+                                _set_exception(future, TelegramFloodWait(ceil(self.flood_wait_until - time())))
+                                continue
+                            if cooldown:
+                                await asyncio.sleep(uniform(2, 4))
+                                await telegram_admission.take_token()
+                            cooldown = max(cooldown, operation_cooldown)
+                            # The caller may have been cancelled while its operation ran, the rest of the batch
+                            # still runs
+                            try:
+                                result = await operation()
+                            except TelegramFloodWait as error:
+                                self.flood_wait_until = error.until
+                                _set_exception(future, error)
+                            except InvalidSession as error:
+                                _set_exception(future, error)
+                                self._fail_operations(error)
+                            except Exception as error:
+                                _set_exception(future, error)
+                            else:
+                                _set_result(future, result)
+                finally:
+                    if not self.is_connected:
+                        await self._release_lock()
+                # Operations queued meanwhile wait for the cooldown
+                await asyncio.sleep(cooldown)
+        except Exception as error:
+            self._fail_operations(error)
+        except BaseException:
+            self._fail_operations(None)
+            raise
+
+    def _fail_operations(self, error: Exception | None):
+        while self._operations:
+            _, future, _ = self._operations.popleft()
+            if error:
+                _set_exception(future, error)
+            else:
+                future.cancel()
+
+    async def _dispatch(self, operation: str, *args, **kwargs):
+        """Runs the Pyrogram or Telethon implementation of the operation, whichever fits the session."""
+        return await getattr(self, f"_{'pyrogram' if self.is_pyrogram else 'telethon'}_{operation}")(*args, **kwargs)
 
     async def get_app_webview_url(self, bot_username: str, bot_shortname: str, default_val: str) -> str:
         self.is_fist_run = await first_run.check_is_first_run(self.session_name)
-        return await self._pyrogram_get_app_webview_url(bot_username, bot_shortname, default_val) if self.is_pyrogram \
-            else await self._telethon_get_app_webview_url(bot_username, bot_shortname, default_val)
+        return await self._submit(partial(self._dispatch, 'get_app_webview_url', bot_username, bot_shortname,
+                                          default_val))
 
     async def get_webview_url(self, bot_username: str, bot_url: str, default_val: str) -> str:
         self.is_fist_run = await first_run.check_is_first_run(self.session_name)
-        return await self._pyrogram_get_webview_url(bot_username, bot_url, default_val) if self.is_pyrogram \
-            else await self._telethon_get_webview_url(bot_username, bot_url, default_val)
+        return await self._submit(partial(self._dispatch, 'get_webview_url', bot_username, bot_url, default_val))
 
     async def join_and_mute_tg_channel(self, link: str):
-        return await self._pyrogram_join_and_mute_tg_channel(link) if self.is_pyrogram \
-            else await self._telethon_join_and_mute_tg_channel(link)
+        return await self._submit(partial(self._dispatch, 'join_and_mute_tg_channel', link), cooldown=uniform(15, 20))
 
     async def update_profile(self, first_name: str = None, last_name: str = None, about: str = None):
-        return await self._pyrogram_update_profile(first_name=first_name, last_name=last_name, about=about) if self.is_pyrogram \
-            else await self._telethon_update_profile(first_name=first_name, last_name=last_name, about=about)
+        return await self._submit(partial(self._dispatch, 'update_profile', first_name=first_name,
+                                          last_name=last_name, about=about), cooldown=uniform(15, 20))
+
+    def _flood_wait(self, seconds: int) -> TelegramFloodWait:
+        logger.warning(f"<ly>{self.session_name}</ly> | FloodWait {seconds}s. The operation will be retried later")
+        telegram_admission.report_flood_wait(seconds)
+        return TelegramFloodWait(seconds)
+
+    def _get_cached_peer(self, username: str) -> dict | None:
+        """Id and access_hash of a user or channel this session resolved before, saved in the accounts config."""
+        return config_utils.get_session_config(self.session_name, CONFIG_PATH).get('peers', {}).get(username.lower())
+
+    def _cache_peer(self, username: str, peer_id: int, access_hash: int, title: str = None):
+        session_config = config_utils.get_session_config(self.session_name, CONFIG_PATH)
+        if not session_config:
+            return
+        peer = {'id': peer_id, 'access_hash': access_hash}
+        if title:
+            peer['title'] = title
+        session_config.setdefault('peers', {})[username.lower()] = peer
+        config_utils.get_config_store(CONFIG_PATH).update(self.session_name, session_config)
+
+    def _forget_peer(self, username: str):
+        """Drops a cached peer after a call with it failed, so it's resolved again next time."""
+        session_config = config_utils.get_session_config(self.session_name, CONFIG_PATH)
+        if session_config.get('peers', {}).pop(username.lower(), None):
+            config_utils.get_config_store(CONFIG_PATH).update(self.session_name, session_config)
+
+    def _forget_webview_data(self, bot_username: str):
+        self._webview_data = None
+        self._forget_peer(bot_username)
 
     async def _telethon_initialize_webview_data(self, bot_username: str, bot_shortname: str = None):
         if not self._webview_data:
-            while True:
-                try:
-                    peer = await self.client.get_input_entity(bot_username)
-                    bot_id = InputUser(user_id=peer.user_id, access_hash=peer.access_hash)
-                    input_bot_app = InputBotAppShortName(bot_id=bot_id, short_name=bot_shortname)
-                    self._webview_data = {'peer': peer, 'app': input_bot_app} if bot_shortname \
-                        else {'peer': peer, 'bot': bot_username}
-                    return
-                except FloodWaitError as fl:
-                    logger.warning(f"<ly>{self.session_name}</ly> | FloodWait {fl}. Waiting {fl.seconds}s")
-                    await asyncio.sleep(fl.seconds + 3)
+            cached_peer = self._get_cached_peer(bot_username)
+            if cached_peer:
+                peer = InputPeerUser(user_id=cached_peer['id'], access_hash=cached_peer['access_hash'])
+            else:
+                peer = await self.client.get_input_entity(bot_username)
+                self._cache_peer(bot_username, peer.user_id, peer.access_hash)
+            bot_id = InputUser(user_id=peer.user_id, access_hash=peer.access_hash)
+            input_bot_app = InputBotAppShortName(bot_id=bot_id, short_name=bot_shortname)
+            self._webview_data = {'peer': peer, 'app': input_bot_app} if bot_shortname \
+                else {'peer': peer, 'bot': bot_username}
 
     async def _pyrogram_initialize_webview_data(self, bot_username: str, bot_shortname: str = None):
         if not self._webview_data:
-            while True:
-                try:
-                    peer = await self.client.resolve_peer(bot_username)
-                    input_bot_app = ptypes.InputBotAppShortName(bot_id=peer, short_name=bot_shortname)
-                    self._webview_data = {'peer': peer, 'app': input_bot_app} if bot_shortname \
-                        else {'peer': peer, 'bot': bot_username}
-                    return
-                except FloodWait as fl:
-                    logger.warning(f"<ly>{self.session_name}</ly> | FloodWait {fl}. Waiting {fl.value}s")
-                    await asyncio.sleep(fl.value + 3)
+            cached_peer = self._get_cached_peer(bot_username)
+            if cached_peer:
+                peer = ptypes.InputPeerUser(user_id=cached_peer['id'], access_hash=cached_peer['access_hash'])
+            else:
+                peer = await self.client.resolve_peer(bot_username)
+                self._cache_peer(bot_username, peer.user_id, peer.access_hash)
+            input_bot_app = ptypes.InputBotAppShortName(bot_id=peer, short_name=bot_shortname)
+            self._webview_data = {'peer': peer, 'app': input_bot_app} if bot_shortname \
+                else {'peer': peer, 'bot': bot_username}
 
     async def _telethon_get_app_webview_url(self, bot_username: str, bot_shortname: str, default_val: str) -> str:
         if self.proxy and not self.client._proxy:
             logger.critical(f"<ly>{self.session_name}</ly> | Proxy found, but not passed to TelegramClient")
             exit(-1)
 
-        async with self.lock:
-            try:
-                if not self.client.is_connected():
-                    await self.client.connect()
-                await self._telethon_initialize_webview_data(bot_username=bot_username, bot_shortname=bot_shortname)
-                await asyncio.sleep(uniform(1, 2))
-
-                start = {'start_param': settings.REF_ID if randint(0, 100) <= 85 else default_val} if self.is_fist_run else {}
+        try:
+            await self._telethon_initialize_webview_data(bot_username=bot_username, bot_shortname=bot_shortname)
+            await asyncio.sleep(uniform(1, 2))
 
-                web_view = await self.client(messages.RequestAppWebViewRequest(
-                    **self._webview_data,
-                    platform='android',
-                    write_allowed=True,
-                    **start
-                ))
+            start = {'start_param': settings.REF_ID if randint(0, 100) <= 85 else default_val} if self.is_fist_run else {}
 
-                return web_view.url
+            web_view = await self.client(messages.RequestAppWebViewRequest(
+                **self._webview_data,
+                platform='android',
+                write_allowed=True,
+                **start
+            ))
 
-            except (UnauthorizedError, AuthKeyUnregisteredError):
-                raise InvalidSession(f"{self.session_name}: User is unauthorized")
-            except (UserDeactivatedError, UserDeactivatedBanError, PhoneNumberBannedError):
-                raise InvalidSession(f"{self.session_name}: User is banned")
+            return web_view.url
 
-            except Exception as error:
-                log_error(f"<ly>{self.session_name}</ly> | Unknown error during Authorization: {type(error).__name__}")
-                await asyncio.sleep(delay=3)
+        except FloodWaitError as fl:
+            raise self._flood_wait(fl.seconds)
+        except (UnauthorizedError, AuthKeyUnregisteredError):
+            raise InvalidSession(f"{self.session_name}: User is unauthorized")
+        except (UserDeactivatedError, UserDeactivatedBanError, PhoneNumberBannedError):
+            raise InvalidSession(f"{self.session_name}: User is banned")
 
-            finally:
-                if self.client.is_connected():
-                    await self.client.disconnect()
-                    await asyncio.sleep(15)
+        except Exception as error:
+            self._forget_webview_data(bot_username)
+            log_error(f"<ly>{self.session_name}</ly> | Unknown error during Authorization: {type(error).__name__}")
+            await asyncio.sleep(delay=3)
 
     async def _telethon_get_webview_url(self, bot_username: str, bot_url: str, default_val: str) -> str:
         if self.proxy and not self.client._proxy:
             logger.critical(f"<ly>{self.session_name}</ly> | Proxy found, but not passed to TelegramClient")
             exit(-1)
 
-        async with self.lock:
-            try:
-                if not self.client.is_connected():
-                    await self.client.connect()
-                await self._telethon_initialize_webview_data(bot_username=bot_username)
-                await asyncio.sleep(uniform(1, 2))
-
-                start = {'start_param': settings.REF_ID if randint(0, 100) <= 85 else default_val} if self.is_fist_run else {}
-
-                start_state = False
-                async for message in self.client.iter_messages('MMproBump_bot'):
-                    if r'/start' in message.text:
-                        start_state = True
-                        break
-                await asyncio.sleep(uniform(0.5, 1))
-                if not start_state:
-                    await self.client(messages.StartBotRequest(bot=self._webview_data.get('peer'),
-                                                               peer=self._webview_data.get('peer'),
-                                                               **start))
-                await asyncio.sleep(uniform(1, 2))
-
-                web_view = await self.client(messages.RequestWebViewRequest(
-                    **self._webview_data,
-                    platform='android',
-                    from_bot_menu=False,
-                    url=bot_url,
-                    **start
-                ))
-
-                return web_view.url
-
-            except (UnauthorizedError, AuthKeyUnregisteredError):
-                raise InvalidSession(f"{self.session_name}: User is unauthorized")
-            except (UserDeactivatedError, UserDeactivatedBanError, PhoneNumberBannedError):
-                raise InvalidSession(f"{self.session_name}: User is banned")
-
-            except Exception as error:
-                log_error(f"<ly>{self.session_name}</ly> | Unknown error during Authorization: {type(error).__name__}")
-                await asyncio.sleep(delay=3)
-
-            finally:
-                if self.client.is_connected():
-                    await self.client.disconnect()
-                    await asyncio.sleep(15)
+        try:
+            await self._telethon_initialize_webview_data(bot_username=bot_username)
+            await asyncio.sleep(uniform(1, 2))
+
+            start = {'start_param': settings.REF_ID if randint(0, 100) <= 85 else default_val} if self.is_fist_run else {}
+
+            start_state = False
+            async for message in self.client.iter_messages('MMproBump_bot'):
+                if r'/start' in message.text:
+                    start_state = True
+                    break
+            await asyncio.sleep(uniform(0.5, 1))
+            if not start_state:
+                await self.client(messages.StartBotRequest(bot=self._webview_data.get('peer'),
+                                                           peer=self._webview_data.get('peer'),
+                                                           **start))
+            await asyncio.sleep(uniform(1, 2))
+
+            web_view = await self.client(messages.RequestWebViewRequest(
+                **self._webview_data,
+                platform='android',
+                from_bot_menu=False,
+                url=bot_url,
+                **start
+            ))
+
+            return web_view.url
+
+        except FloodWaitError as fl:
+            raise self._flood_wait(fl.seconds)
+        except (UnauthorizedError, AuthKeyUnregisteredError):
+            raise InvalidSession(f"{self.session_name}: User is unauthorized")
+        except (UserDeactivatedError, UserDeactivatedBanError, PhoneNumberBannedError):
+            raise InvalidSession(f"{self.session_name}: User is banned")
+
+        except Exception as error:
+            self._forget_webview_data(bot_username)
+            log_error(f"<ly>{self.session_name}</ly> | Unknown error during Authorization: {type(error).__name__}")
+            await asyncio.sleep(delay=3)
 
     async def _pyrogram_get_app_webview_url(self, bot_username: str, bot_shortname: str, default_val: str) -> str:
         if self.proxy and not self.client.proxy:
             logger.critical(f"<ly>{self.session_name}</ly> | Proxy found, but not passed to Client")
             exit(-1)
 
-        async with self.lock:
-            try:
-                if not self.client.is_connected:
-                    await self.client.connect()
-                await self._pyrogram_initialize_webview_data(bot_username, bot_shortname)
-                await asyncio.sleep(uniform(1, 2))
-
-                start = {'start_param': settings.REF_ID if randint(0, 100) <= 85 else default_val} if self.is_fist_run else {}
-                web_view = await self.client.invoke(pmessages.RequestAppWebView(
-                    **self._webview_data,
-                    platform='android',
-                    write_allowed=True,
-                    **start
-                ))
-
-                return web_view.url
-
-            except (Unauthorized, AuthKeyUnregistered):
-                raise InvalidSession(f"{self.session_name}: User is unauthorized")
-            except (UserDeactivated, UserDeactivatedBan, PhoneNumberBanned):
-                raise InvalidSession(f"{self.session_name}: User is banned")
-
-            except Exception as error:
-                log_error(f"<ly>{self.session_name}</ly> | Unknown error during Authorization: {type(error).__name__}")
-                await asyncio.sleep(delay=3)
-
-            finally:
-                if self.client.is_connected:
-                    await self.client.disconnect()
-                    await asyncio.sleep(15)
+        try:
+            await self._pyrogram_initialize_webview_data(bot_username, bot_shortname)
+            await asyncio.sleep(uniform(1, 2))
+
+            start = {'start_param': settings.REF_ID if randint(0, 100) <= 85 else default_val} if self.is_fist_run else {}
+            web_view = await self.client.invoke(pmessages.RequestAppWebView(
+                **self._webview_data,
+                platform='android',
+                write_allowed=True,
+                **start
+            ))
+
+            return web_view.url
+
+        except FloodWait as fl:
+            raise self._flood_wait(fl.value)
+        except (Unauthorized, AuthKeyUnregistered):
+            raise InvalidSession(f"{self.session_name}: User is unauthorized")
+        except (UserDeactivated, UserDeactivatedBan, PhoneNumberBanned):
+            raise InvalidSession(f"{self.session_name}: User is banned")
+
+        except Exception as error:
+            self._forget_webview_data(bot_username)
+            log_error(f"<ly>{self.session_name}</ly> | Unknown error during Authorization: {type(error).__name__}")
+            await asyncio.sleep(delay=3)
 
     async def _pyrogram_get_webview_url(self, bot_username: str, bot_url: str, default_val: str) -> str:
         if self.proxy and not self.client.proxy:
             logger.critical(f"<ly>{self.session_name}</ly> | Proxy found, but not passed to Client")
             exit(-1)
 
-        async with self.lock:
-            try:
-                if not self.client.is_connected:
-                    await self.client.connect()
-                await self._pyrogram_initialize_webview_data(bot_username)
-                await asyncio.sleep(uniform(1, 2))
-
-                start = {'start_param': settings.REF_ID if randint(0, 100) <= 85 else default_val} if self.is_fist_run else {}
-
-                start_state = False
-                async for message in self.client.get_chat_history('MMproBump_bot'):
-                    if r'/start' in message.text:
-                        start_state = True
-                        break
-                await asyncio.sleep(uniform(0.5, 1))
-                if not start_state:
-                    await self.client.invoke(pmessages.StartBot(bot=self._webview_data.get('peer'),
-                                                                peer=self._webview_data.get('peer'),
-                                                                random_id=randint(1, 2**63),
-                                                                **start))
-                await asyncio.sleep(uniform(1, 2))
-                web_view = await self.client.invoke(pmessages.RequestWebView(
-                    **self._webview_data,
-                    platform='android',
-                    from_bot_menu=False,
-                    url=bot_url,
-                    **start
-                ))
-
-                return web_view.url
-
-            except (Unauthorized, AuthKeyUnregistered):
-                raise InvalidSession(f"{self.session_name}: User is unauthorized")
-            except (UserDeactivated, UserDeactivatedBan, PhoneNumberBanned):
-                raise InvalidSession(f"{self.session_name}: User is banned")
-
-            except Exception as error:
-                log_error(f"<ly>{self.session_name}</ly> | Unknown error during Authorization: {type(error).__name__}")
-                await asyncio.sleep(delay=3)
-
-            finally:
-                if self.client.is_connected:
-                    await self.client.disconnect()
-                    await asyncio.sleep(15)
+        try:
+            await self._pyrogram_initialize_webview_data(bot_username)
+            await asyncio.sleep(uniform(1, 2))
+
+            start = {'start_param': settings.REF_ID if randint(0, 100) <= 85 else default_val} if self.is_fist_run else {}
+
+            start_state = False
+            async for message in self.client.get_chat_history('MMproBump_bot'):
+                if r'/start' in message.text:
+                    start_state = True
+                    break
+            await asyncio.sleep(uniform(0.5, 1))
+            if not start_state:
+                await self.client.invoke(pmessages.StartBot(bot=self._webview_data.get('peer'),
+                                                            peer=self._webview_data.get('peer'),
+                                                            random_id=randint(1, 2**63),
+                                                            **start))
+            await asyncio.sleep(uniform(1, 2))
+            web_view = await self.client.invoke(pmessages.RequestWebView(
+                **self._webview_data,
+                platform='android',
+                from_bot_menu=False,
+                url=bot_url,
+                **start
+            ))
+
+            return web_view.url
+
+        except FloodWait as fl:
+            raise self._flood_wait(fl.value)
+        except (Unauthorized, AuthKeyUnregistered):
+            raise InvalidSession(f"{self.session_name}: User is unauthorized")
+        except (UserDeactivated, UserDeactivatedBan, PhoneNumberBanned):
+            raise InvalidSession(f"{self.session_name}: User is banned")
+
+        except Exception as error:
+            self._forget_webview_data(bot_username)
+            log_error(f"<ly>{self.session_name}</ly> | Unknown error during Authorization: {type(error).__name__}")
+            await asyncio.sleep(delay=3)
 
     async def _telethon_join_and_mute_tg_channel(self, link: str):
         path = link.replace("https://t.me/", "")
         if path == 'money':
             return
 
-        async with self.lock:
-            async with self.client as client:
-                try:
-                    if path.startswith('+'):
-                        invite_hash = path[1:]
-                        result = await client(messages.ImportChatInviteRequest(hash=invite_hash))
-                        channel_title = result.chats[0].title
-                        entity = result.chats[0]
-                    else:
-                        entity = await client.get_entity(f'@{path}')
-                        await client(channels.JoinChannelRequest(channel=entity))
-                        channel_title = entity.title
-
-                    await asyncio.sleep(1)
-
-                    await client(account.UpdateNotifySettingsRequest(
-                        peer=InputNotifyPeer(entity),
-                        settings=InputPeerNotifySettings(
-                            show_previews=False,
-                            silent=True,
-                            mute_until=datetime.today() + timedelta(days=365)
-                        )
-                    ))
-
-                    logger.info(f"<ly>{self.session_name}</ly> | Subscribed to channel: <y>{channel_title}</y>")
-                except FloodWaitError as fl:
-                    logger.warning(f"<ly>{self.session_name}</ly> | FloodWait {fl}. Waiting {fl.seconds}s")
-                    return fl.seconds
-                except Exception as e:
-                    log_error(
-                        f"<ly>{self.session_name}</ly> | (Task) Error while subscribing to tg channel {link}: {e}")
-
-            await asyncio.sleep(uniform(15, 20))
+        client = self.client
+        try:
+            if path.startswith('+'):
+                invite_hash = path[1:]
+                result = await client(messages.ImportChatInviteRequest(hash=invite_hash))
+                channel_title = result.chats[0].title
+                entity = result.chats[0]
+            else:
+                cached_peer = self._get_cached_peer(path)
+                if cached_peer:
+                    entity = InputPeerChannel(channel_id=cached_peer['id'], access_hash=cached_peer['access_hash'])
+                    channel_title = cached_peer.get('title', path)
+                else:
+                    entity = await client.get_entity(f'@{path}')
+                    channel_title = entity.title
+                    self._cache_peer(path, entity.id, entity.access_hash, channel_title)
+                await client(channels.JoinChannelRequest(channel=entity))
+
+            await asyncio.sleep(1)
+
+            await client(account.UpdateNotifySettingsRequest(
+                peer=InputNotifyPeer(entity),
+                settings=InputPeerNotifySettings(
+                    show_previews=False,
+                    silent=True,
+                    mute_until=datetime.today() + timedelta(days=365)
+                )
+            ))
+
+            logger.info(f"<ly>{self.session_name}</ly> | Subscribed to channel: <y>{channel_title}</y>")
+        except FloodWaitError as fl:
+            raise self._flood_wait(fl.seconds)
+        except Exception as e:
+            self._forget_peer(path)
+            log_error(
+                f"<ly>{self.session_name}</ly> | (Task) Error while subscribing to tg channel {link}: {e}")
         return
 
     async def _pyrogram_join_and_mute_tg_channel(self, link: str):
@@ -324,42 +520,43 @@ class UniversalTelegramClient:
         if path == 'money':
             return
 
-        async with self.lock:
-            async with self.client:
-                try:
-                    if path.startswith('+'):
-                        invite_hash = path[1:]
-                        result = await self.client.invoke(pmessages.ImportChatInvite(hash=invite_hash))
-                        channel_title = result.chats[0].title
-                        entity = result.chats[0]
-                        peer = ptypes.InputPeerChannel(channel_id=entity.id, access_hash=entity.access_hash)
-                    else:
-                        peer = await self.client.resolve_peer(f'@{path}')
-                        channel = ptypes.InputChannel(channel_id=peer.channel_id, access_hash=peer.access_hash)
-                        await self.client.invoke(pchannels.JoinChannel(channel=channel))
-                        channel_title = path
-
-                    await asyncio.sleep(1)
-
-                    await self.client.invoke(paccount.UpdateNotifySettings(
-                        peer=ptypes.InputNotifyPeer(peer=peer),
-                        settings=ptypes.InputPeerNotifySettings(
-                            show_previews=False,
-                            silent=True,
-                            mute_until=2147483647))
-                    )
-
-                    logger.info(f"<ly>{self.session_name}</ly> | Subscribed to channel: <y>{channel_title}</y>")
-                except FloodWait as e:
-                    logger.warning(f"<ly>{self.session_name}</ly> | FloodWait {e}. Waiting {e.value}s")
-                    return e.value
-                except UserAlreadyParticipant:
-                    logger.info(f"<ly>{self.session_name}</ly> | Was already Subscribed to channel: <y>{link}</y>")
-                except Exception as e:
-                    log_error(
-                        f"<ly>{self.session_name}</ly> | (Task) Error while subscribing to tg channel {link}: {e}")
-
-            await asyncio.sleep(uniform(15, 20))
+        try:
+            if path.startswith('+'):
+                invite_hash = path[1:]
+                result = await self.client.invoke(pmessages.ImportChatInvite(hash=invite_hash))
+                channel_title = result.chats[0].title
+                entity = result.chats[0]
+                peer = ptypes.InputPeerChannel(channel_id=entity.id, access_hash=entity.access_hash)
+            else:
+                cached_peer = self._get_cached_peer(path)
+                if cached_peer:
+                    peer = ptypes.InputPeerChannel(channel_id=cached_peer['id'], access_hash=cached_peer['access_hash'])
+                else:
+                    peer = await self.client.resolve_peer(f'@{path}')
+                    self._cache_peer(path, peer.channel_id, peer.access_hash)
+                channel = ptypes.InputChannel(channel_id=peer.channel_id, access_hash=peer.access_hash)
+                await self.client.invoke(pchannels.JoinChannel(channel=channel))
+                channel_title = path
+
+            await asyncio.sleep(1)
+
+            await self.client.invoke(paccount.UpdateNotifySettings(
+                peer=ptypes.InputNotifyPeer(peer=peer),
+                settings=ptypes.InputPeerNotifySettings(
+                    show_previews=False,
+                    silent=True,
+                    mute_until=2147483647))
+            )
+
+            logger.info(f"<ly>{self.session_name}</ly> | Subscribed to channel: <y>{channel_title}</y>")
+        except FloodWait as e:
+            raise self._flood_wait(e.value)
+        except UserAlreadyParticipant:
+            logger.info(f"<ly>{self.session_name}</ly> | Was already Subscribed to channel: <y>{link}</y>")
+        except Exception as e:
+            self._forget_peer(path)
+            log_error(
+                f"<ly>{self.session_name}</ly> | (Task) Error while subscribing to tg channel {link}: {e}")
         return
 
     async def _telethon_update_profile(self, first_name: str = None, last_name: str = None, about: str = None):
@@ -372,14 +569,13 @@ class UniversalTelegramClient:
         if not update_params:
             return
 
-        async with self.lock:
-            async with self.client:
-                try:
-                    await self.client(account.UpdateProfileRequest(**update_params))
-                except Exception as e:
-                    log_error(
-                        f"<ly>{self.session_name}</ly> | Failed to update profile: {e}")
-            await asyncio.sleep(uniform(15, 20))
+        try:
+            await self.client(account.UpdateProfileRequest(**update_params))
+        except FloodWaitError as fl:
+            raise self._flood_wait(fl.seconds)
+        except Exception as e:
+            log_error(
+                f"<ly>{self.session_name}</ly> | Failed to update profile: {e}")
 
     async def _pyrogram_update_profile(self, first_name: str = None, last_name: str = None, about: str = None):
         update_params = {
@@ -391,11 +587,10 @@ class UniversalTelegramClient:
         if not update_params:
             return
 
-        async with self.lock:
-            async with self.client:
-                try:
-                    await self.client.invoke(paccount.UpdateProfile(**update_params))
-                except Exception as e:
-                    log_error(
-                        f"<ly>{self.session_name}</ly> | Failed to update profile: {e}")
-            await asyncio.sleep(uniform(15, 20))
+        try:
+            await self.client.invoke(paccount.UpdateProfile(**update_params))
+        except FloodWait as fl:
+            raise self._flood_wait(fl.value)
+        except Exception as e:
+            log_error(
+                f"<ly>{self.session_name}</ly> | Failed to update profile: {e}")
@@ -2,7 +2,7 @@ import asyncio
 from contextlib import suppress
 from bot.core.launcher import process
 from bot.utils import PROXY_CHAIN, logger
-from bot.utils.proxy_utils import get_proxy_chain, check_proxy
+from bot.utils.proxy_utils import get_proxy_chain, set_proxy_chain, check_proxy
 from os import system
 
 
@@ -12,9 +12,7 @@ async def main():
         if proxy:
             logger.info("Getting proxy for Proxy Chain")
             if await check_proxy(proxy_str):
-                import socket, socks
-                socks.set_default_proxy(proxy)
-                socket.socket = socks.socksocket
+                set_proxy_chain(proxy)
             else:
                 logger.error("Proxy chain didn't respond. Can't start the bot using proxy chain")
                 input('Press any key to exit: ')